@@ -0,0 +1,184 @@
+"""Defines AdmissionControl, which protects the server from overload.
+
+Connections beyond Config.MAX_CONNECTIONS are turned away. Each
+connection gets a token bucket per rate-limited message type, so a
+client flooding one kind of message only loses the excess messages of
+that kind. Other message types share one default bucket. While
+the event loop is running late, low-priority messages such as
+getupdates are dropped so that moves and battle moves stay responsive.
+"""
+from collections import namedtuple
+import asyncio
+import time
+
+from config import Config
+
+
+AdmissionReport = namedtuple("AdmissionReport", [
+    "connections",
+    "rejected_connections",
+    "messages",
+    "rate_limited",
+    "shed",
+    "max_lag",
+    "overloaded_time"
+])
+
+
+class TokenBucket:
+    """A TokenBucket allows rate actions per second, in bursts of up to burst.
+
+    Tokens are added continuously at rate per second, up to burst, and
+    each action takes one.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "last_time")
+
+    def __init__(self, rate, burst):
+        """Start with a full bucket."""
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last_time = time.monotonic()
+
+    def take(self, now):
+        """Take a token if there is one.
+
+        Returns:
+            True if a token was taken, False if the bucket is empty.
+        """
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.last_time) * self.rate)
+        self.last_time = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class ConnectionLimiter:
+    """The token buckets of one connection.
+
+    Each message type in Config.RATE_LIMITS has a bucket of its own.
+    Every other message type, including ones the server does not know,
+    shares one bucket limited by Config.DEFAULT_RATE_LIMIT.
+    """
+
+    def __init__(self):
+        """Start with the default bucket; others are made as needed."""
+        self.buckets = {}
+        self.default_bucket = TokenBucket(*Config.DEFAULT_RATE_LIMIT)
+
+    def take(self, message_type, now):
+        """Take a token for a message of the given type."""
+        bucket = self.buckets.get(message_type)
+        if bucket is None:
+            limit = Config.RATE_LIMITS.get(message_type)
+            if limit is None:
+                return self.default_bucket.take(now)
+            bucket = TokenBucket(*limit)
+            self.buckets[message_type] = bucket
+        return bucket.take(now)
+
+
+class AdmissionControl:
+    """Decides which connections and messages the server handles."""
+
+    def __init__(self):
+        """Start with no connections and empty statistics."""
+        self.connections = 0
+        self.lag = 0
+        self.rejected_connections = 0
+        self.messages = 0
+        self.rate_limited = 0
+        self.shed = 0
+        self.max_lag = 0
+        self.overloaded_time = 0
+
+    def connect(self):
+        """Admit a new connection if there is room for it.
+
+        Returns:
+            A ConnectionLimiter for the connection, or None if it should
+            be turned away. disconnect must be called when an admitted
+            connection closes.
+        """
+        if self.connections >= Config.MAX_CONNECTIONS:
+            self.rejected_connections += 1
+            return None
+        self.connections += 1
+        return ConnectionLimiter()
+
+    def disconnect(self):
+        """Forget a connection that was admitted."""
+        self.connections -= 1
+
+    def is_overloaded(self):
+        """Check if the event loop is running too late to keep up."""
+        return self.lag > Config.OVERLOAD_LAG
+
+    def admit(self, limiter, message_type):
+        """Check if a message from a connection should be handled.
+
+        Messages are dropped if their type's token bucket is empty, or
+        if they are low-priority and the server is overloaded.
+
+        Args:
+            limiter: The ConnectionLimiter of the connection.
+            message_type: The verb of the message, before the first "|".
+        """
+        self.messages += 1
+        if (message_type in Config.LOW_PRIORITY_MESSAGES
+                and self.is_overloaded()):
+            self.shed += 1
+            return False
+        if not limiter.take(message_type, time.monotonic()):
+            self.rate_limited += 1
+            return False
+        return True
+
+    async def run_lag_monitor(self):
+        """Measure how late the event loop runs its callbacks forever.
+
+        Every Config.LAG_PROBE_DT seconds, the lag is how much later than
+        asked for a sleep wakes up.
+        """
+        loop = asyncio.get_event_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(Config.LAG_PROBE_DT)
+            self.lag = max(0, loop.time() - start - Config.LAG_PROBE_DT)
+            self.max_lag = max(self.max_lag, self.lag)
+            if self.is_overloaded():
+                self.overloaded_time += loop.time() - start
+
+    def get_report(self):
+        """Get the statistics since the last report and reset them."""
+        report = AdmissionReport(
+            connections=self.connections,
+            rejected_connections=self.rejected_connections,
+            messages=self.messages,
+            rate_limited=self.rate_limited,
+            shed=self.shed,
+            max_lag=self.max_lag,
+            overloaded_time=self.overloaded_time)
+        self.rejected_connections = 0
+        self.messages = 0
+        self.rate_limited = 0
+        self.shed = 0
+        self.max_lag = 0
+        self.overloaded_time = 0
+        return report
+
+    async def run_reports(self):
+        """Print a report every Config.TICK_REPORT_DT seconds forever."""
+        while True:
+            await asyncio.sleep(Config.TICK_REPORT_DT)
+            report = self.get_report()
+            print(f"admission: {report.connections} connections, "
+                  f"{report.rejected_connections} rejected, "
+                  f"{report.messages} messages, "
+                  f"{report.rate_limited} rate limited, "
+                  f"{report.shed} shed, "
+                  f"max lag {report.max_lag * 1000:.1f} ms, "
+                  f"overloaded {report.overloaded_time:.1f} s")
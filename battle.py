@@ -2,7 +2,6 @@
 from collections import namedtuple
 from enum import Enum, unique
 import math
-import random
 import uuid
 
 
@@ -169,6 +168,29 @@ Stats = namedtuple("Stats", [
 ])
 
 
+class LiveStats:
+    """The current stats of a Combatant, which change during a Battle.
+
+    Unlike Stats, LiveStats are updated in place, so that taking damage
+    or using stamina does not allocate a new object every turn.
+    """
+
+    __slots__ = Stats._fields
+
+    def __init__(self, stats):
+        """Initialize with a copy of the given Stats."""
+        for field, value in zip(Stats._fields, stats):
+            setattr(self, field, value)
+
+    def freeze(self):
+        """Get an immutable Stats with the current values."""
+        return Stats(*(getattr(self, field) for field in Stats._fields))
+
+    def to_json(self):
+        """Convert to a dict which can be converted to a JSON string."""
+        return {field: getattr(self, field) for field in Stats._fields}
+
+
 @unique
 class Species(Enum):
     """The different species that exist ingame."""
@@ -420,7 +442,7 @@ class Combatant:
         self.species = species
         self.level = level
         self.base_stats = base_stats or species.base_stats
-        self.stats = self.get_stats()
+        self.stats = LiveStats(self.get_stats())
         self.max_hp = self.stats.hp
         self.moves = moves
         self.is_ai = False
@@ -432,16 +454,16 @@ class Combatant:
 
     def reset_stats(self):
         """Reset any changes to stats."""
-        self.stats = self.get_stats()
+        self.stats = LiveStats(self.get_stats())
         self.max_hp = self.stats.hp
 
     def take_damage(self, damage):
         """Decrease the Combatant's HP by a given amount."""
-        self.stats = self.stats._replace(hp=self.stats.hp-damage)
+        self.stats.hp -= damage
 
     def use_stamina(self, stamina_draw):
         """Decrease the Combatant's stamina by a given amount."""
-        self.stats = self.stats._replace(stam=self.stats.stam-stamina_draw)
+        self.stats.stam -= stamina_draw
 
 
 class AICombatant(Combatant):
@@ -465,10 +487,10 @@ class RandomMoveAICombatant(AICombatant):
 
     def next_move(self, battle):
         """Just return a random move and target."""
-        move = random.choice(self.moves)
-        target = random.choice(list(c.combatant_id for c in battle.combatants
-                                    if (c.combatant_id.side
-                                        is not self.combatant_id.side)))
+        move = battle.rng.choice(self.moves)
+        target = battle.rng.choice(list(
+            c.combatant_id for c in battle.combatants
+            if c.combatant_id.side is not self.combatant_id.side))
         return MoveChoice(move, target)
 
 
@@ -489,15 +511,20 @@ CombatantId = namedtuple("CombatantId", [
 class Battle:
     """Describes a battle between a player and an AI."""
 
-    def __init__(self, combatants1, combatants2):
-        """Assign CombatantIDs to each Combatant."""
+    def __init__(self, combatants1, combatants2, rng):
+        """Assign CombatantIDs to each Combatant.
+
+        Every random choice in the battle, including the UUIDs of the
+        combatants, is drawn from rng, a random.Random.
+        """
         self.combatants = combatants1 + combatants2
+        self.rng = rng
         for combatant in combatants1:
-            generated_uuid = uuid.uuid4()
+            generated_uuid = uuid.UUID(int=rng.getrandbits(128), version=4)
             c_id = CombatantId(Side.SIDE_1, generated_uuid)
             combatant.combatant_id = c_id
         for combatant in combatants2:
-            generated_uuid = uuid.uuid4()
+            generated_uuid = uuid.UUID(int=rng.getrandbits(128), version=4)
             c_id = CombatantId(Side.SIDE_2, generated_uuid)
             combatant.combatant_id = c_id
 
@@ -612,9 +639,9 @@ class Battle:
             except ValueError:
                 continue
             move = move_choice.move
-            if random.random() < Battle.get_eff_acc(combatant,
-                                                    move,
-                                                    target):
+            if self.rng.random() < Battle.get_eff_acc(combatant,
+                                                      move,
+                                                      target):
                 self.process_move(combatant, target, move)
         self.combatants = [c for c in self.combatants if c]
         return self.get_winner()
@@ -693,7 +720,7 @@ class Battle:
                     combatant_obj = {
                         "species": combatant.species.id,
                         "level": combatant.level,
-                        "stats": combatant.stats._asdict(),
+                        "stats": combatant.stats.to_json(),
                         "max_hp": combatant.max_hp,
                         "moves": [m.to_json() for m in combatant.moves]
                     }
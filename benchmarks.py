@@ -0,0 +1,133 @@
+"""Benchmarks for the payloads the server sends and receives.
+
+Run with `python benchmarks.py` from the repository root.
+"""
+import os
+import time
+
+from websockets.extensions.permessage_deflate import PerMessageDeflate
+from websockets.frames import Frame, Opcode
+
+from compression import ServerDeflateFactory, precompress
+from loadworld import load_worlds
+from serializer import get_backends
+from storeworld import chunk_to_client_json, world_to_client_json
+from world import World
+
+import entity  # Just to register the entities declared in entity.py
+import tile  # Just to register the tiles declared in tile.py
+del entity
+del tile
+
+
+def time_per_call(func, min_time=0.2):
+    """Get the average time in seconds that func takes to run."""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / calls
+
+
+def get_world_messages(world):
+    """Get the messages that send a whole world to a client, encoded."""
+    spawn_pos = next(iter(world.spawn_points.values())).to_spawn_pos()
+    messages = [f"world|{world_to_client_json(world, spawn_pos)}"]
+    messages += [f"chunk|{chunk_to_client_json(world, chunk_x, chunk_y)}"
+                 for chunk_x, chunk_y in world.get_chunks()]
+    return [message.encode("utf-8") for message in messages]
+
+
+def get_extensions():
+    """Get the permessage-deflate extension a client is given, and a plain one.
+
+    The first is negotiated by ServerDeflateFactory for a client that
+    asks for no parameters. The second has the same settings but does
+    not send pre-compressed messages.
+    """
+    _, extension = ServerDeflateFactory().process_request_params([], [])
+    plain_extension = PerMessageDeflate(
+        extension.remote_no_context_takeover,
+        extension.local_no_context_takeover,
+        extension.remote_max_window_bits,
+        extension.local_max_window_bits,
+        extension.compress_settings)
+    return extension, plain_extension
+
+
+def bench_compression():
+    """Compare compressing world messages per send with pre-compressing.
+
+    For each world, prints the bytes of all its messages uncompressed,
+    encoded by permessage-deflate per send, and pre-compressed once,
+    along with the CPU time the extension takes to encode them for one
+    send in each case.
+    """
+    extension, plain_extension = get_extensions()
+    print(f"{'world':42} {'raw':>8} {'per-send':>10} {'us':>6} "
+          f"{'precomp':>8} {'us':>6}")
+    for world_file in sorted(os.listdir("worlds")):
+        world = World.get_world_by_id(world_file[:-5])
+        messages = get_world_messages(world)
+        frames = [Frame(Opcode.TEXT, message) for message in messages]
+        raw_size = sum(len(message) for message in messages)
+        per_send_size = sum(len(plain_extension.encode(frame).data)
+                            for frame in frames)
+        per_send_time = time_per_call(
+            lambda: [plain_extension.encode(frame) for frame in frames])
+        for message in messages:
+            precompress(message.decode("utf-8"))
+        precompressed_size = sum(len(extension.encode(frame).data)
+                                 for frame in frames)
+        precompressed_time = time_per_call(
+            lambda: [extension.encode(frame) for frame in frames])
+        print(f"{world_file:42} {raw_size:8} {per_send_size:10} "
+              f"{per_send_time * 1e6:6.0f} {precompressed_size:8} "
+              f"{precompressed_time * 1e6:6.1f}")
+
+
+def bench_serialization():
+    """Compare the JSON backends on the objects the server encodes and decodes.
+
+    For each installed backend, prints the time to decode every world
+    file, to encode every world for saving, to encode every chunk for
+    the client, and to encode the entities of every world as in the
+    entities message.
+    """
+    world_files = []
+    for world_file in sorted(os.listdir("worlds")):
+        with open(f"worlds/{world_file}", "rb") as file:
+            world_files.append(file.read())
+    worlds = [World.get_world_by_id(world_file[:-5])
+              for world_file in sorted(os.listdir("worlds"))]
+    saves = [world.to_json_save() for world in worlds]
+    chunks = [world.to_json_client_chunk(chunk_x, chunk_y)
+              for world in worlds
+              for chunk_x, chunk_y in world.get_chunks()]
+    entities = [[e.to_json(True) for e in world.entities]
+                for world in worlds]
+    print(f"{'backend':8} {'decode ms':>10} {'save ms':>8} "
+          f"{'chunks ms':>10} {'entities us':>12}")
+    for backend in get_backends():
+        decode_time = time_per_call(
+            lambda: [backend.loads(data) for data in world_files])
+        save_time = time_per_call(
+            lambda: [backend.dumps(save) for save in saves])
+        chunk_time = time_per_call(
+            lambda: [backend.dumps(chunk) for chunk in chunks])
+        entity_time = time_per_call(
+            lambda: ["|".join(backend.dumps(e) for e in world_entities)
+                     for world_entities in entities])
+        print(f"{backend.name:8} {decode_time * 1e3:10.2f} "
+              f"{save_time * 1e3:8.2f} {chunk_time * 1e3:10.2f} "
+              f"{entity_time * 1e6:12.1f}")
+
+
+if __name__ == "__main__":
+    load_worlds()
+    bench_compression()
+    print()
+    bench_serialization()
@@ -1,37 +1,158 @@
-"""Defines block_movement to handle collisions between entity and object."""
-from geometry import Vec
+"""Defines move_and_collide to handle collisions between entity and object.
 
+Collisions are resolved with a swept axis-aligned bounding box test: the
+entity's bounding box is swept along its displacement and stopped at the
+earliest time of impact with any wall, after which the rest of the
+displacement slides along the wall. Because the whole path is tested,
+fast movement cannot tunnel through thin walls.
+"""
+import math
 
-def block_movement(bbox, entity_start_pos, entity):
-    """Reposition entity when the entity hits a wall.
+from config import Config
+from tilecoord import TileCoord
+
+# The gap in pixels left between an entity and a wall it runs into.
+# BoundingBox.is_touching counts shared edges as touching, so an entity
+# flush against a wall would otherwise still be touching it.
+GAP = 1
+
+# A displacement is resolved against at most one wall per axis, and a
+# wall hit exactly on a corner blocks one axis at a time.
+_MAX_ITERATIONS = 3
+
+
+def _axis_times(start, delta, low, high):
+    """Get the times when a point moving on one axis enters/exits (low, high).
+
+    Times are fractions of delta. If the point never moves, it is either
+    always inside or never inside the interval.
+    """
+    if delta > 0:
+        return (low - start) / delta, (high - start) / delta
+    if delta < 0:
+        return (high - start) / delta, (low - start) / delta
+    if low < start < high:
+        return -math.inf, math.inf
+    return math.inf, -math.inf
+
+
+def get_tile_walls(world, left, top, right, bottom):
+    """Get the boxes of movement-blocking tiles in the given region.
+
+    Returns:
+        A list of (left, top, right, bottom) tuples.
+    """
+    start_x = int(left) // Config.BLOCK_WIDTH
+    start_y = int(top) // Config.BLOCK_WIDTH
+    end_x = int(right) // Config.BLOCK_WIDTH
+    end_y = int(bottom) // Config.BLOCK_WIDTH
+    walls = []
+    for block_y in range(start_y, end_y + 1):
+        for block_x in range(start_x, end_x + 1):
+            if world.get_tile(TileCoord(block_x, block_y)).blocks_movement:
+                tile_x = block_x * Config.BLOCK_WIDTH
+                tile_y = block_y * Config.BLOCK_WIDTH
+                walls.append((tile_x, tile_y,
+                              tile_x + Config.BLOCK_WIDTH,
+                              tile_y + Config.BLOCK_WIDTH))
+    return walls
+
+
+def get_entity_walls(entities, entity, left, top, right, bottom):
+    """Get the boxes of movement-blocking entities in the given region.
+
+    The entity being moved is excluded.
+
+    Returns:
+        A list of (left, top, right, bottom) tuples.
+    """
+    walls = []
+    for wall in entities:
+        if wall is entity or not wall.blocks_movement:
+            continue
+        bbox = wall.get_bounding_box()
+        if (bbox.vec1.x > right or bbox.vec2.x < left
+                or bbox.vec1.y > bottom or bbox.vec2.y < top):
+            continue
+        walls.append((bbox.vec1.x, bbox.vec1.y, bbox.vec2.x, bbox.vec2.y))
+    return walls
+
+
+def sweep(x, y, width, height, dx, dy, walls):
+    """Sweep a box along (dx, dy) and resolve collisions with walls.
+
+    Walls that the box already overlaps at the start (counting the GAP
+    margin) are ignored, so that an entity which is somehow stuck inside
+    a wall can walk out of it.
+
+    Args:
+        x, y: The upper-left corner of the moving box.
+        width, height: The size of the moving box.
+        dx, dy: The displacement of the moving box.
+        walls: An iterable of (left, top, right, bottom) tuples.
+    Returns:
+        The upper-left corner of the box after moving, as a tuple.
+    """
+    for _ in range(_MAX_ITERATIONS):
+        if not dx and not dy:
+            break
+        first_time = 1
+        block_x = block_y = None
+        for left, top, right, bottom in walls:
+            low_x = left - width - GAP
+            high_x = right + GAP
+            low_y = top - height - GAP
+            high_y = bottom + GAP
+            entry_x, exit_x = _axis_times(x, dx, low_x, high_x)
+            entry_y, exit_y = _axis_times(y, dy, low_y, high_y)
+            entry = max(entry_x, entry_y)
+            if (entry < 0 or entry >= first_time
+                    or entry >= min(exit_x, exit_y)):
+                continue
+            first_time = entry
+            if entry_x >= entry_y:
+                block_x = low_x if dx > 0 else high_x
+                block_y = None
+            else:
+                block_x = None
+                block_y = low_y if dy > 0 else high_y
+        if block_x is None and block_y is None:
+            return x + dx, y + dy
+        x += dx * first_time
+        y += dy * first_time
+        dx *= 1 - first_time
+        dy *= 1 - first_time
+        if block_x is not None:
+            x = block_x
+            dx = 0
+        else:
+            y = block_y
+            dy = 0
+    return x + dx, y + dy
+
+
+def move_and_collide(entity, offset, world=None, walls=()):
+    """Move an entity by offset, stopping and sliding at walls on the way.
 
     Args:
-        bbox: The BoundingBox of the wall.
-        entity_start_pos: The position of the entity before the entity
-            moved and hit the wall.
-        entity: The entity object.
+        entity: The entity to move.
+        offset: The displacement vector.
+        world: If given, the World whose movement-blocking tiles the
+            entity collides with.
+        walls: Entities that the entity collides with. Only those that
+            block movement are considered.
     """
-    entity_end_pos = entity.pos
-    entity.pos = entity_start_pos
-    if entity.get_bounding_box().is_touching(bbox):
-        entity.pos = entity_end_pos
-    else:
-        dp = entity_end_pos - entity_start_pos
-        dx = dp.x
-        dy = dp.y
-        entity_width = entity.get_width()
-        entity_height = entity.get_height()
-
-        entity.move(Vec(dx, 0))
-        if entity.get_bounding_box().is_touching(bbox):
-            if dx > 0:
-                entity.set_x(bbox.get_left_b() - entity_width - 1)
-            elif dx < 0:
-                entity.set_x(bbox.get_right_b() + 1)
-
-        entity.move(Vec(0, dy))
-        if entity.get_bounding_box().is_touching(bbox):
-            if dy > 0:
-                entity.set_y(bbox.get_top_b() - entity_height - 1)
-            elif dy < 0:
-                entity.set_y(bbox.get_bottom_b() + 1)
+    bbox = entity.get_bounding_box()
+    x, y = bbox.vec1.x, bbox.vec1.y
+    width = bbox.vec2.x - x
+    height = bbox.vec2.y - y
+    dx, dy = offset.x, offset.y
+    left = min(x, x + dx) - GAP
+    top = min(y, y + dy) - GAP
+    right = max(x, x + dx) + width + GAP
+    bottom = max(y, y + dy) + height + GAP
+    boxes = get_entity_walls(walls, entity, left, top, right, bottom)
+    if world is not None:
+        boxes += get_tile_walls(world, left, top, right, bottom)
+    new_x, new_y = sweep(x, y, width, height, dx, dy, boxes)
+    entity.pos.set(new_x, new_y)
@@ -0,0 +1,103 @@
+"""Defines the permessage-deflate setup and pre-compressed messages.
+
+Messages are compressed with the WebSocket permessage-deflate extension.
+Large messages that are sent unchanged to many clients, such as world
+chunks, can be compressed once with precompress. When such a message is
+sent, PrecompressedDeflate uses the stored compressed bytes instead of
+compressing the message again.
+
+This only works if the server does not use context takeover, i.e. if
+each message is compressed on its own, which ServerDeflateFactory
+enforces. Otherwise the client's decompressor would not match the
+server's compressor after a pre-compressed message.
+"""
+from collections import OrderedDict
+import dataclasses
+from typing import Any, Dict
+import zlib
+
+from websockets.extensions.permessage_deflate import (
+    PerMessageDeflate, ServerPerMessageDeflateFactory)
+
+from config import Config
+
+
+# The four bytes that end a sync flush, which permessage-deflate removes.
+_EMPTY_BLOCK = b"\x00\x00\xff\xff"
+
+# The opcode of a continuation frame.
+_OP_CONT = 0
+
+# Maps UTF-8 encoded messages to their compressed frame data, oldest first.
+_precompressed: Dict[bytes, Any] = OrderedDict()
+
+
+def deflate(data, level=Config.PRECOMPRESS_LEVEL):
+    """Compress bytes as one permessage-deflate message on its own."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED,
+                                  -Config.DEFLATE_WINDOW_BITS)
+    compressed = compressor.compress(data) + compressor.flush(
+        zlib.Z_SYNC_FLUSH)
+    return compressed[:-len(_EMPTY_BLOCK)]
+
+
+def precompress(message):
+    """Compress a text message once so that sending it does not compress it.
+
+    Only the Config.PRECOMPRESS_CACHE_SIZE messages pre-compressed or
+    sent most recently are kept. A message that has been dropped is
+    compressed as it is sent, like any other.
+    """
+    data = message.encode("utf-8")
+    if data in _precompressed:
+        _precompressed.move_to_end(data)
+        return
+    _precompressed[data] = deflate(data)
+    if len(_precompressed) > Config.PRECOMPRESS_CACHE_SIZE:
+        _precompressed.popitem(last=False)
+
+
+def _replace_frame(frame, **changes):
+    """Copy a websockets Frame with some fields changed."""
+    if dataclasses.is_dataclass(frame):
+        return dataclasses.replace(frame, **changes)
+    return frame._replace(**changes)
+
+
+class PrecompressedDeflate(PerMessageDeflate):
+    """permessage-deflate that sends pre-compressed messages as they are."""
+
+    def encode(self, frame):
+        """Encode an outgoing frame, using pre-compressed data if stored."""
+        if (frame.fin and frame.opcode != _OP_CONT
+                and self.local_no_context_takeover
+                and self.local_max_window_bits >= Config.DEFLATE_WINDOW_BITS):
+            data = bytes(frame.data)
+            compressed = _precompressed.get(data)
+            if compressed is not None:
+                _precompressed.move_to_end(data)
+                return _replace_frame(frame, data=compressed, rsv1=True)
+        return super().encode(frame)
+
+
+class ServerDeflateFactory(ServerPerMessageDeflateFactory):
+    """Negotiates permessage-deflate without server context takeover."""
+
+    def __init__(self):
+        """Configure the extension from Config."""
+        super().__init__(
+            server_no_context_takeover=True,
+            server_max_window_bits=Config.DEFLATE_WINDOW_BITS,
+            compress_settings={"level": Config.DEFLATE_LEVEL,
+                               "memLevel": Config.DEFLATE_MEM_LEVEL})
+
+    def process_request_params(self, params, accepted_extensions):
+        """Accept the extension, using PrecompressedDeflate."""
+        response_params, extension = super().process_request_params(
+            params, accepted_extensions)
+        return response_params, PrecompressedDeflate(
+            extension.remote_no_context_takeover,
+            extension.local_no_context_takeover,
+            extension.remote_max_window_bits,
+            extension.local_max_window_bits,
+            extension.compress_settings)
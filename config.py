@@ -16,9 +16,119 @@ greater than MAX_MOVE_DT, they are considered two separate
 moves. Otherwise, they are considered a single move.
 
 UPDATE_DT: Amount of seconds between entity-updating calls.
-This is a lower bound.
+Calls are scheduled against fixed deadlines, so this is the
+average period as long as updates take less time than this.
+
+UPDATE_CATCH_UP: What the entity-updating loop does when it falls
+behind: "skip" to run one update with the real elapsed time, or
+"substep" to run one update of UPDATE_DT per missed deadline.
+
+MAX_SUBSTEPS: Maximum number of updates run to catch up at once when
+catching up by "substep".
 
 PORTAL_COOLDOWN_DT: Amount of seconds before portal transports.
+
+PORTAL_PREFETCH_RADIUS: Players within this many blocks of a portal
+have the world it leads to serialized ahead of time.
+
+CHUNK_SIZE: Width and height of the chunks that worlds are sent to the
+client in, in blocks.
+
+CHUNK_RADIUS: Chunks within this many chunks of the player's spawn
+chunk are sent straight away when the player enters a world. The
+rest are streamed afterwards.
+
+DEFLATE_WINDOW_BITS: Size of the server's permessage-deflate sliding
+window, in bits.
+
+DEFLATE_LEVEL: zlib compression level for messages compressed as they
+are sent.
+
+DEFLATE_MEM_LEVEL: zlib memory level for messages compressed as they
+are sent.
+
+PRECOMPRESS_LEVEL: zlib compression level for messages compressed once
+and sent to many clients, such as world chunks.
+
+PRECOMPRESS_CACHE_SIZE: Number of pre-compressed messages to keep.
+
+PATHFINDING_NODES_PER_TICK: Maximum number of tiles that path searches
+expand each update, shared between all searches.
+
+PATH_CACHE_SIZE: Number of path searches to keep per world.
+
+FLOW_FIELD_CACHE_SIZE: Number of flow fields to keep per world.
+
+MAX_CONNECTIONS: Maximum number of WebSocket connections open at once.
+Connections beyond this are closed straight away.
+
+RATE_LIMITS: Maps message types to (rate, burst) pairs. Each connection
+may send a message type rate times per second on average, and burst
+times at once. Messages beyond that are dropped.
+
+DEFAULT_RATE_LIMIT: The (rate, burst) pair of the one bucket shared by
+every message type that is not in RATE_LIMITS.
+
+LOW_PRIORITY_MESSAGES: Message types that are dropped while the server
+is overloaded.
+
+OVERLOAD_LAG: The server is overloaded while the event loop runs more
+than this many seconds late.
+
+LAG_PROBE_DT: Amount of seconds between measurements of how late the
+event loop runs.
+
+PING_INTERVAL: Amount of seconds between the WebSocket pings sent to
+each client to check that the connection is still alive.
+
+PING_TIMEOUT: Amount of seconds to wait for the answer to a ping
+before closing the connection as dead.
+
+MAX_HIBERNATED_PLAYERS: Number of offline players to keep, so that they
+can pick up where they left off when they reconnect. The players that
+have been offline the longest are forgotten first.
+
+SESSION_BUFFER_SIZE: Number of the most recent messages sent to each
+client that are kept, so that they can be sent again if the client
+resumes its session.
+
+RESUME_WINDOW: Amount of seconds after a connection closes during
+which the client can resume its session.
+
+DIALOGUE_TIMEOUT: Amount of seconds after which a conversation with an
+entity that the player has not moved on is ended.
+
+SAVE_DIR: Folder that the snapshots and journals of worlds are saved
+in. The worlds folder itself is never written to.
+
+JOURNAL_FLUSH_DT: Amount of seconds between writes of the changes
+made to worlds to their journals.
+
+JOURNAL_COMPACT_SIZE: Size in bytes past which a world's journal is
+replaced by a new snapshot of the world.
+
+SERIALIZE_WORKERS: Number of threads that hash big worlds off the
+event loop.
+
+OFFLOAD_MIN_TILES: Worlds with at least this many tiles are hashed by
+the SERIALIZE_WORKERS threads rather than on the event loop.
+
+RECORD_PATH: File to record the messages clients send to, to be played
+back with replay.py, or None not to record them.
+
+RECORD_BUFFER_SIZE: Number of bytes of recorded messages buffered in
+memory before they are written to RECORD_PATH.
+
+RANDOM_SEED: Seed of the random numbers each player's wild encounters
+and battles use, or None for unseeded random numbers. Set it to the
+same value when recording and replaying traffic to make the same
+random choices.
+
+JSON_BACKEND: Library used to encode and decode JSON: "orjson",
+"msgspec", "json", or "auto" to use the fastest one installed.
+
+TICK_REPORT_DT: Amount of seconds between printed reports of how much
+of the update budget entity updates are using, and of tick timings.
 """
 
 
@@ -32,4 +142,47 @@ class Config:
     SPEED_MULTIPLIER = 2
     MAX_MOVE_DT = 0.1
     UPDATE_DT = 0.1
+    UPDATE_CATCH_UP = "skip"
+    MAX_SUBSTEPS = 5
     PORTAL_COOLDOWN_DT = 0.2
+    PORTAL_PREFETCH_RADIUS = 3
+    TICK_REPORT_DT = 60
+    CHUNK_SIZE = 8
+    CHUNK_RADIUS = 1
+    DEFLATE_WINDOW_BITS = 15
+    DEFLATE_LEVEL = 6
+    DEFLATE_MEM_LEVEL = 5
+    PRECOMPRESS_LEVEL = 9
+    PRECOMPRESS_CACHE_SIZE = 1024
+    PATHFINDING_NODES_PER_TICK = 1000
+    PATH_CACHE_SIZE = 256
+    FLOW_FIELD_CACHE_SIZE = 32
+    JSON_BACKEND = "auto"
+    MAX_CONNECTIONS = 256
+    RATE_LIMITS = {
+        "move": (60, 30),
+        "fastmove": (60, 30),
+        "getupdates": (20, 10),
+        "interact": (10, 5),
+        "dialoguechoose": (10, 5),
+        "battlemove": (10, 5),
+        "worldcache": (1, 5)
+    }
+    DEFAULT_RATE_LIMIT = (10, 5)
+    LOW_PRIORITY_MESSAGES = ("getupdates",)
+    OVERLOAD_LAG = 0.05
+    LAG_PROBE_DT = 0.05
+    PING_INTERVAL = 10
+    PING_TIMEOUT = 10
+    MAX_HIBERNATED_PLAYERS = 10000
+    SESSION_BUFFER_SIZE = 64
+    RESUME_WINDOW = 30
+    DIALOGUE_TIMEOUT = 120
+    SAVE_DIR = "saves"
+    JOURNAL_FLUSH_DT = 1
+    JOURNAL_COMPACT_SIZE = 1024*1024
+    SERIALIZE_WORKERS = 2
+    OFFLOAD_MIN_TILES = 1024
+    RECORD_PATH = None
+    RECORD_BUFFER_SIZE = 1024*1024
+    RANDOM_SEED = None
@@ -1,8 +1,9 @@
-"""Defines the Cutscene class and its subclasses."""
-
+"""Defines the Cutscene class, its subclasses and CutsceneTimeline."""
+import bisect
 from typing import Any, Dict
 
 from geometry import Vec
+from pathfinding import get_center_tile, path_to_waypoints, pathfinder
 
 _cutscenes: Dict[str, Any] = {}  # Maps scene_types to Cutscene classes.
 
@@ -39,6 +40,25 @@ class Cutscene:
             raise ValueError
         return cutscene_class
 
+    def get_duration(self):
+        """Get how long the cutscene lasts on the server, in seconds."""
+        return 0
+
+    def start(self, timeline):
+        """Start playing the cutscene on a CutsceneTimeline."""
+
+    def finish(self, timeline):
+        """Finish playing the cutscene on a CutsceneTimeline."""
+
+    def resolve_path(self, world, positions):
+        """Find the path of anything the cutscene moves around the world.
+
+        Args:
+            world: The World the cutscene plays in.
+            positions: A dict mapping entity names to their positions
+                after the cutscenes before this one, which is updated.
+        """
+
     def get_scene_type(self):
         """Get the scene_type of a Cutscene."""
         cutscene_class = type(self)
@@ -69,6 +89,10 @@ class WaitScene(Cutscene):
         super().__init__(cutscene_dict)
         self.wait_duration = cutscene_dict["wait_duration"]
 
+    def get_duration(self):
+        """Get how long the cutscene lasts on the server, in seconds."""
+        return self.wait_duration
+
     def to_json(self, is_to_client):
         """Convert a cutscene to a dict which can be converted to a JSON string.
 
@@ -95,6 +119,52 @@ class MoveScene(Cutscene):
         self.move_destination = Vec.from_json(
             cutscene_dict["move_destination"])
         self.move_duration = cutscene_dict["move_duration"]
+        self.pathfind = cutscene_dict.get("pathfind", False)
+        self.waypoints = None
+
+    def get_duration(self):
+        """Get how long the cutscene lasts on the server, in seconds."""
+        return self.move_duration
+
+    def start(self, timeline):
+        """Start moving the entity along its waypoints."""
+        try:
+            entity = timeline.world.get_entity(self.entity_name)
+        except ValueError:
+            return
+        timeline.start_move(
+            entity, self.waypoints or [self.move_destination],
+            self.move_duration)
+
+    def finish(self, timeline):
+        """Put the entity at its destination."""
+        timeline.finish_move()
+
+    def resolve_path(self, world, positions):
+        """Find the path of the entity around walls if pathfind is set.
+
+        The waypoints are the positions the entity passes through on
+        the way to move_destination, ending with it. They are None if
+        pathfind is not set or there is no path, in which case the
+        entity moves in a straight line.
+        """
+        try:
+            entity = world.get_entity(self.entity_name)
+        except ValueError:
+            return
+        start = positions.get(self.entity_name, entity.pos)
+        positions[self.entity_name] = self.move_destination
+        self.waypoints = None
+        if not self.pathfind:
+            return
+        width = entity.get_width()
+        path = pathfinder.find_path(
+            world,
+            get_center_tile(start, width),
+            get_center_tile(self.move_destination, width))
+        if path is not None:
+            self.waypoints = path_to_waypoints(path[1:-1], width)
+            self.waypoints.append(self.move_destination)
 
     def to_json(self, is_to_client):
         """Convert a cutscene to a dict which can be converted to a JSON string.
@@ -104,13 +174,19 @@ class MoveScene(Cutscene):
                 to the client, False to get the version of the cutscene
                 to save to file.
         """
-        del is_to_client  # Unused
-        return {
+        cutscene_obj = {
             "scene_type": self.scene_type,
             "entity_name": self.entity_name,
             "move_destination": self.move_destination.to_json(),
             "move_duration": self.move_duration
         }
+        if is_to_client:
+            if self.waypoints is not None:
+                cutscene_obj["waypoints"] = [
+                    waypoint.to_json() for waypoint in self.waypoints]
+        elif self.pathfind:
+            cutscene_obj["pathfind"] = True
+        return cutscene_obj
 
 
 @register_cutscene("dialogue")
@@ -137,3 +213,122 @@ class DialogueScene(Cutscene):
             "entity_name": self.entity_name,
             "dialogue": self.dialogue
         }
+
+
+class CutsceneMove:
+    """The state of an entity being moved by a MoveScene.
+
+    The entity moves along straight lines between points at a steady
+    speed, taking duration seconds from start_time.
+    """
+
+    def __init__(self, entity, points, start_time, duration):
+        """Initialize with the entity, the points it moves through and when."""
+        self.entity = entity
+        self.points = points
+        self.start_time = start_time
+        self.duration = duration
+        self.lengths = [0]
+        for point, next_point in zip(points, points[1:]):
+            self.lengths.append(self.lengths[-1] + point.dist_to(next_point))
+
+    def get_pos(self, time):
+        """Get the position of the entity at a time on the timeline."""
+        if self.duration <= 0:
+            return self.points[-1]
+        fraction = min(max((time - self.start_time) / self.duration, 0), 1)
+        length = fraction * self.lengths[-1]
+        index = min(bisect.bisect_right(self.lengths, length),
+                    len(self.points) - 1)
+        start_length = self.lengths[index - 1]
+        segment_length = self.lengths[index] - start_length
+        if not segment_length:
+            return self.points[index]
+        start = self.points[index - 1]
+        return start + (self.points[index] - start) * (
+            (length - start_length) / segment_length)
+
+
+class CutsceneTimeline:
+    """A CutsceneTimeline plays the cutscenes of a world on the server.
+
+    Each world has at most one timeline, shared by every player in the
+    world. The timeline is advanced by the update tick, which only checks
+    whether the current cutscene is over. An entity being moved by a
+    MoveScene is taken out of its world's active entities, and where it
+    is along the way is only worked out by get_entity_pos when entity
+    snapshots are sent. Cutscenes that the client plays out, like
+    dialogue, take no time on the server.
+    """
+
+    def __init__(self, world):
+        """Start playing the cutscenes of a world from the beginning."""
+        self.world = world
+        self.time = 0
+        self.scene_index = -1
+        self.scene_end = 0
+        self.move = None
+        self.move_active_set = None
+        self.start_next_scene()
+
+    def is_done(self):
+        """Check if every cutscene has finished."""
+        return self.scene_index >= len(self.world.cutscenes)
+
+    def advance(self, dt):
+        """Move the timeline forward by dt seconds."""
+        self.time += dt
+        while not self.is_done() and self.time >= self.scene_end:
+            self.world.cutscenes[self.scene_index].finish(self)
+            self.start_next_scene()
+
+    def skip_to_end(self):
+        """Finish every remaining cutscene straight away."""
+        while not self.is_done():
+            self.world.cutscenes[self.scene_index].finish(self)
+            self.start_next_scene()
+
+    def start_next_scene(self):
+        """Start the cutscene after the current one, if there is one."""
+        self.scene_index += 1
+        if self.is_done():
+            return
+        cutscene = self.world.cutscenes[self.scene_index]
+        scene_start = self.scene_end
+        self.scene_end = scene_start + cutscene.get_duration()
+        cutscene.start(self)
+
+    def start_move(self, entity, waypoints, duration):
+        """Start moving an entity through the given positions.
+
+        The entity is not updated until the move finishes.
+        """
+        self.move = CutsceneMove(entity, [entity.pos.freeze()] + waypoints,
+                                 self.scene_end - duration, duration)
+        self.move_active_set = entity.active_set
+        if entity.active_set is not None:
+            entity.active_set.pop(entity, None)
+        entity.active_set = None
+
+    def finish_move(self):
+        """Put the entity being moved at its destination and wake it."""
+        if self.move is None:
+            return
+        entity = self.move.entity
+        entity.pos = self.move.points[-1]
+        entity.active_set = self.move_active_set
+        entity.wake()
+        self.move = None
+        self.move_active_set = None
+
+    def get_moving_entity(self):
+        """Get the entity being moved by a MoveScene, or None."""
+        if self.move is None:
+            return None
+        return self.move.entity
+
+    def get_entity_pos(self, entity):
+        """Get the position of an entity, which may be in a MoveScene."""
+        if self.move is not None and self.move.entity is entity:
+            return self.move.get_pos(self.time)
+        return entity.pos
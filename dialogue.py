@@ -0,0 +1,209 @@
+"""Defines DialogueGraph, which entities' dialogue is compiled into.
+
+In world files, dialogue is a list of lines. A line is either a string,
+which the entity says, or a list of choices for the player, followed by
+a dict mapping the index of each choice to what the entity says back.
+That list is compiled when the world loads into an immutable graph of
+DialogueNodes, shared by every entity with the same dialogue. Where each
+player is in a conversation is kept on the player as a Conversation,
+which is dropped when the conversation ends, when the player goes
+offline, or after Config.DIALOGUE_TIMEOUT seconds without a reply.
+"""
+from collections import namedtuple
+import asyncio
+import time
+from typing import Any, Dict
+
+from config import Config
+from entitybasic import EntityEventContext
+from serializer import dumps
+from util import Util
+from world import World
+
+
+_graphs: Dict[str, Any] = {}  # Maps dialogue JSON to DialogueGraphs.
+
+
+# A node is either a line, with text and one next_id, or a choice, with
+# choices and one next_id per choice. A next_id of None ends the dialogue.
+DialogueNode = namedtuple("DialogueNode", [
+    "text",
+    "choices",
+    "next_ids"
+])
+
+
+class DialogueGraph:
+    """An immutable graph of DialogueNodes, starting at start_id.
+
+    The dialogue list it was compiled from is kept for saving.
+    """
+
+    __slots__ = ("nodes", "start_id", "dialogue_list")
+
+    def __init__(self, nodes, start_id, dialogue_list):
+        """Initialize with a tuple of nodes and the id of the first one."""
+        self.nodes = nodes
+        self.start_id = start_id
+        self.dialogue_list = dialogue_list
+
+    @staticmethod
+    def from_json(dialogue_list):
+        """Compile the dialogue list of an entity in a world file.
+
+        Entities with the same dialogue share one DialogueGraph.
+
+        Returns:
+            The DialogueGraph, or None if the dialogue is malformed.
+        """
+        key = dumps(dialogue_list)
+        graph = _graphs.get(key)
+        if graph is None:
+            try:
+                graph = DialogueGraph.compile(dialogue_list)
+            except (ValueError, TypeError):
+                return None
+            _graphs[key] = graph
+        return graph
+
+    @staticmethod
+    def compile(dialogue_list):
+        """Compile a dialogue list into a new DialogueGraph.
+
+        The list is compiled from the end, so that each node is made
+        after the nodes it leads to.
+
+        Raises:
+            ValueError if the dialogue is malformed.
+        """
+        nodes = []
+
+        def add_node(node):
+            nodes.append(node)
+            return len(nodes) - 1
+
+        next_id = None
+        responses = None
+        for line in reversed(dialogue_list):
+            if isinstance(line, dict):
+                if responses is not None:
+                    raise ValueError
+                responses = {int(k): v for k, v in line.items()}
+                continue
+            if isinstance(line, str):
+                if responses is not None:
+                    raise ValueError
+                next_id = add_node(DialogueNode(line, None, (next_id,)))
+            elif isinstance(line, list):
+                responses = responses or {}
+                choice_next_ids = tuple(
+                    add_node(DialogueNode(responses[choice], None, (next_id,)))
+                    if choice in responses else next_id
+                    for choice in range(len(line)))
+                next_id = add_node(
+                    DialogueNode(None, tuple(line), choice_next_ids))
+                responses = None
+            else:
+                raise ValueError
+        if responses is not None:
+            raise ValueError
+        return DialogueGraph(tuple(nodes), next_id, dialogue_list)
+
+    def to_json(self):
+        """Get the dialogue list to save to file."""
+        return self.dialogue_list
+
+    async def send_node(self, ws, entity_name, node_id):
+        """Send a node, which can be a line or a choice."""
+        node = self.nodes[node_id]
+        if node.choices is None:
+            await Util.send_dialogue(ws, entity_name, node.text)
+        else:
+            await Util.send_dialogue_choices(ws, entity_name, node.choices)
+
+    async def go_to(self, event_ctx, entity, node_id):
+        """Move the player's conversation to a node, or end it at None."""
+        if node_id is None:
+            await end_conversation(event_ctx)
+            return
+        event_ctx.player.conversation = Conversation(
+            entity, node_id, time.monotonic())
+        await self.send_node(event_ctx.ws, entity.name, node_id)
+
+    async def on_interact(self, event_ctx, entity):
+        """Send the next line when the player interacts with the entity.
+
+        While the player has a choice to make, the choice is sent again.
+        """
+        conversation = event_ctx.player.conversation
+        if conversation is None or conversation.entity is not entity:
+            await self.go_to(event_ctx, entity, self.start_id)
+            return
+        node = self.nodes[conversation.node_id]
+        if node.choices is None:
+            await self.go_to(event_ctx, entity, node.next_ids[0])
+        else:
+            await self.go_to(event_ctx, entity, conversation.node_id)
+
+    async def on_dialogue_choose(self, event_ctx, entity, choice):
+        """Respond to the player choosing dialogue.
+
+        Choices that the player was not given are ignored.
+        """
+        conversation = event_ctx.player.conversation
+        if conversation is None or conversation.entity is not entity:
+            return
+        node = self.nodes[conversation.node_id]
+        if node.choices is None or not 0 <= choice < len(node.choices):
+            return
+        await self.go_to(event_ctx, entity, node.next_ids[choice])
+
+
+class Conversation:
+    """Where a player is in an entity's DialogueGraph, and since when."""
+
+    __slots__ = ("entity", "node_id", "last_time")
+
+    def __init__(self, entity, node_id, last_time):
+        """Initialize with the entity spoken to and the current node."""
+        self.entity = entity
+        self.node_id = node_id
+        self.last_time = last_time
+
+
+async def end_conversation(event_ctx):
+    """End the player's conversation, if any, and tell the entity."""
+    conversation = event_ctx.player.conversation
+    if conversation is None:
+        return
+    event_ctx.player.conversation = None
+    entity = conversation.entity
+    await Util.send_dialogue_end(event_ctx.ws, entity.name)
+    await entity.on_dialogue_end(event_ctx)
+
+
+async def end_player_conversation(game, player):
+    """End a player's conversation outside of a message from the player."""
+    if player.conversation is None:
+        return
+    await end_conversation(EntityEventContext(
+        game=game,
+        ws=player.ws,
+        username=player.username,
+        world=World.get_world_by_id(player.world_id),
+        player=player))
+
+
+async def run_conversation_timeouts(game):
+    """End conversations left without a reply for too long, forever.
+
+    Every Config.DIALOGUE_TIMEOUT seconds, the conversations of online
+    players that have not moved on in that time are ended.
+    """
+    while True:
+        await asyncio.sleep(Config.DIALOGUE_TIMEOUT)
+        deadline = time.monotonic() - Config.DIALOGUE_TIMEOUT
+        for player in list(game.players.values()):
+            conversation = player.conversation
+            if conversation is not None and conversation.last_time < deadline:
+                await end_player_conversation(game, player)
@@ -1,89 +1,11 @@
 """Defines classes for various entities."""
-from collision import block_movement
+from collision import move_and_collide
 from config import Config
+from dialogue import DialogueGraph
 from entitybasic import Entity, register_entity
 from geometry import Direction, Vec
-from util import Util
-
-
-class Dialogue:
-    """Class to track an entity's dialogue."""
-
-    def __init__(self, dialogue, conv_progress=None):
-        """Initialize a Dialogue tracker."""
-        self.dialogue = dialogue
-        self.conv_progress = conv_progress or {}
-
-    @staticmethod
-    def from_json(dialogue_list):
-        """Convert from JSON to a Dialogue object."""
-        try:
-            return Dialogue([
-                {int(k): v for k, v in d.items()}
-                if isinstance(d, dict) else d
-                for d in dialogue_list])
-        except ValueError:
-            return None
-
-    async def send_line(self, ws, entity_name, line):
-        """Send a line of dialogue, which can be a string or list."""
-        if isinstance(line, list):
-            await Util.send_dialogue_choices(ws, entity_name, line)
-        elif isinstance(line, str):
-            await Util.send_dialogue(ws, entity_name, line)
-        else:
-            raise ValueError
-
-    async def on_interact(self, event_ctx, entity):
-        """Send dialogue when player interacts with the entity."""
-        if event_ctx.username in self.conv_progress:
-            self.conv_progress[event_ctx.username] += 1
-            try:
-                await self.send_line(
-                    event_ctx.ws,
-                    entity.name,
-                    self.dialogue[self.conv_progress[event_ctx.username]])
-                event_ctx.player.talking_to = entity
-            except IndexError:
-                del self.conv_progress[event_ctx.username]
-                await self.end_dialogue(event_ctx, entity)
-                event_ctx.player.talking_to = None
-            except ValueError:
-                del self.conv_progress[event_ctx.username]
-                await self.on_interact(event_ctx, entity.name)
-        else:
-            self.conv_progress[event_ctx.username] = 0
-            await self.send_line(
-                event_ctx.ws,
-                entity.name,
-                self.dialogue[self.conv_progress[event_ctx.username]])
-            event_ctx.player.talking_to = entity
-
-    async def on_dialogue_choose(self, event_ctx, entity, choice):
-        """Respond to player choosing dialogue."""
-        if event_ctx.username in self.conv_progress:
-            self.conv_progress[event_ctx.username] += 1
-            try:
-                await self.send_line(
-                    event_ctx.ws,
-                    entity.name,
-                    self.dialogue[self.conv_progress[event_ctx.username]].get(
-                        choice))
-                event_ctx.player.talking_to = entity
-            except IndexError:
-                del self.conv_progress[event_ctx.username]
-                await self.end_dialogue(event_ctx, entity)
-                event_ctx.player.talking_to = None
-            except ValueError:
-                self.conv_progress[event_ctx.username] -= 1
-
-    async def end_dialogue(self, event_ctx, entity):
-        """End dialogue and call any handlers."""
-        await Util.send_dialogue_end(event_ctx.ws, entity.name)
-        try:
-            await entity.on_dialogue_end(event_ctx)
-        except AttributeError:
-            pass
+from pathfinding import get_center_tile, path_to_waypoints, pathfinder
+from tilecoord import TileCoord
 
 
 @register_entity("walker")
@@ -109,34 +31,20 @@ class Walker(Entity):
 
     def update(self, update_ctx):
         """Move and turn if min_x or max_x reached. Check for collision."""
-        start_pos = self.pos
-        super().update(update_ctx)
-        if self.pos.x > self.max_x:
+        offset = self.velocity * update_ctx.dt
+        end_x = self.pos.x + offset.x
+        if end_x > self.max_x:
             self.facing = Direction.LEFT
-            self.set_x(self.max_x - (self.pos.x - self.max_x))
-            self.velocity = Vec(-self.speed, 0)
-        elif self.pos.x < self.min_x:
+            end_x = self.max_x - (end_x - self.max_x)
+            self.velocity.set(-self.speed, 0)
+        elif end_x < self.min_x:
             self.facing = Direction.RIGHT
-            self.set_x(self.min_x + (self.min_x - self.pos.x))
-            self.velocity = Vec(self.speed, 0)
-
-        wall_entities = [
-            entity for entity in update_ctx.world.entities
-            if entity.blocks_movement
-            and self.is_touching(entity)]
-        wall_players = [
-            player for player in
-            update_ctx.game.get_players_by_world(
-                update_ctx.world.get_world_id())
-            if self.is_touching(player)]
-        walls = wall_entities + wall_players
-        if walls:
-            walls.sort(
-                key=lambda wall:
-                wall.pos.dist_to(self.pos))
-            for wall in walls:
-                block_movement(wall.get_bounding_box(),
-                               start_pos, self)
+            end_x = self.min_x + (self.min_x - end_x)
+            self.velocity.set(self.speed, 0)
+        players = update_ctx.game.get_players_by_world(
+            update_ctx.world.get_world_id())
+        move_and_collide(self, Vec(end_x - self.pos.x, offset.y),
+                         walls=update_ctx.world.entities + players)
 
     async def on_interact(self, event_ctx):
         """Send dialogue when player interacts with Walker."""
@@ -159,15 +67,234 @@ class Walker(Entity):
         """Walker's bounding box is same as player's."""
         return super().get_bounding_box_of_width(Config.PLAYER_WIDTH)
 
+    def to_json(self, is_to_client):
+        """Convert a Walker to a dict which can be converted to JSON.
+
+        Args:
+            is_to_client: True to get the version of the entity sent
+                to the client, False to get the version of the entity
+                to save to file.
+        """
+        entity_obj = super().to_json(is_to_client)
+        if not is_to_client:
+            entity_obj["velocity"] = Vec(self.speed, 0).to_json()
+            entity_obj["min_x"] = self.min_x
+            entity_obj["max_x"] = self.max_x
+            entity_obj["dialogue"] = self.dialogue.to_json()
+        return entity_obj
+
     @staticmethod
     def from_json(entity_dict):
-        """Convert a dict representing a JSON object into a Walker."""
+        """Convert a dict representing a JSON object into a Walker.
+
+        min_x and max_x are optional, and are three blocks either side
+        of pos by default.
+        """
         pos = Vec.from_json(entity_dict["pos"])
         velocity = Vec.from_json(entity_dict["velocity"])
         facing = Direction.str_to_direction(entity_dict["facing"])
         name = entity_dict["name"]
-        dialogue = Dialogue.from_json(entity_dict["dialogue"])
-        return Walker(pos, velocity, facing, name, dialogue)
+        dialogue = DialogueGraph.from_json(entity_dict["dialogue"])
+        walker = Walker(pos, velocity, facing, name, dialogue)
+        walker.min_x = entity_dict.get("min_x", walker.min_x)
+        walker.max_x = entity_dict.get("max_x", walker.max_x)
+        return walker
+
+
+@register_entity("patroller")
+class Patroller(Entity):
+    """An Entity that walks between patrol points, finding its way there.
+
+    It walks to each of its patrol points in turn, going back to the first
+    after the last, along paths found by the pathfinder.
+    """
+
+    def __init__(self, pos, velocity, facing, name, patrol_points):
+        """Initialize the Patroller.
+
+        Set speed to the norm of the given velocity.
+        Set patrol_points to a list of TileCoords.
+        """
+        super().__init__(pos, velocity, facing, name)
+        self.speed = self.velocity.norm()
+        self.velocity = Vec(0, 0)
+        self.patrol_points = patrol_points
+        self.patrol_index = 0
+        self.search = None
+        self.waypoints = None
+
+    def is_idle(self):
+        """A Patroller with somewhere to go is never idle."""
+        return not self.patrol_points
+
+    def update(self, update_ctx):
+        """Look for a path to the next patrol point or walk along it."""
+        if not self.patrol_points:
+            return
+        if self.waypoints is None:
+            self.velocity.set(0, 0)
+            width = self.get_width()
+            if self.search is None or self.search.is_stale():
+                self.search = pathfinder.request(
+                    update_ctx.world,
+                    get_center_tile(self.pos, width),
+                    self.patrol_points[self.patrol_index])
+            if not self.search.done:
+                return
+            if self.search.path is None:
+                self.next_patrol_point()
+                return
+            self.waypoints = path_to_waypoints(self.search.path[1:], width)
+            self.search = None
+        if not self.waypoints:
+            self.next_patrol_point()
+            return
+        offset = self.waypoints[0] - self.pos
+        dist = offset.norm()
+        max_dist = self.speed * update_ctx.dt
+        if dist <= max_dist:
+            self.waypoints.pop(0)
+        else:
+            offset = offset * (max_dist / dist)
+        if abs(offset.x) >= abs(offset.y):
+            self.facing = Direction.RIGHT if offset.x > 0 else Direction.LEFT
+        else:
+            self.facing = Direction.DOWN if offset.y > 0 else Direction.UP
+        if dist:
+            self.velocity.set(offset.x / dist * self.speed,
+                              offset.y / dist * self.speed)
+        players = update_ctx.game.get_players_by_world(
+            update_ctx.world.get_world_id())
+        move_and_collide(self, offset,
+                         walls=update_ctx.world.entities + players)
+
+    def next_patrol_point(self):
+        """Start heading for the next patrol point."""
+        self.patrol_index = (self.patrol_index + 1) % len(self.patrol_points)
+        self.waypoints = None
+        self.search = None
+
+    def get_bounding_box(self):
+        """Patroller's bounding box is same as player's."""
+        return super().get_bounding_box_of_width(Config.PLAYER_WIDTH)
+
+    def to_json(self, is_to_client):
+        """Convert a Patroller to a dict which can be converted to JSON.
+
+        Args:
+            is_to_client: True to get the version of the entity sent
+                to the client, False to get the version of the entity
+                to save to file.
+        """
+        entity_obj = super().to_json(is_to_client)
+        if not is_to_client:
+            entity_obj["velocity"] = Vec(self.speed, 0).to_json()
+            entity_obj["patrol_points"] = [
+                {"block_x": point.block_x, "block_y": point.block_y}
+                for point in self.patrol_points]
+        return entity_obj
+
+    @staticmethod
+    def from_json(entity_dict):
+        """Convert a dict representing a JSON object into a Patroller."""
+        pos = Vec.from_json(entity_dict["pos"])
+        velocity = Vec.from_json(entity_dict["velocity"])
+        facing = Direction.str_to_direction(entity_dict["facing"])
+        name = entity_dict["name"]
+        patrol_points = [
+            TileCoord(point["block_x"], point["block_y"])
+            for point in entity_dict["patrol_points"]]
+        return Patroller(pos, velocity, facing, name, patrol_points)
+
+
+@register_entity("chaser")
+class Chaser(Entity):
+    """An Entity that chases the nearest player within its chase range.
+
+    It steers along the flow field towards the player's tile, which is
+    shared with every other Chaser after the same player.
+    """
+
+    def __init__(self, pos, velocity, facing, name, chase_range):
+        """Initialize the Chaser.
+
+        Set speed to the norm of the given velocity.
+        Set chase_range, in blocks.
+        """
+        super().__init__(pos, velocity, facing, name)
+        self.speed = self.velocity.norm()
+        self.velocity = Vec(0, 0)
+        self.chase_range = chase_range
+
+    def is_idle(self):
+        """A Chaser keeps watching for players to chase."""
+        return False
+
+    def update(self, update_ctx):
+        """Step towards the nearest player in range, if any."""
+        world = update_ctx.world
+        players = update_ctx.game.get_players_by_world(world.get_world_id())
+        max_dist = self.chase_range * Config.BLOCK_WIDTH
+        target = min(
+            (p for p in players if self.pos.dist_to(p.pos) <= max_dist),
+            key=lambda p: self.pos.dist_to(p.pos),
+            default=None)
+        if target is None:
+            self.velocity.set(0, 0)
+            return
+        width = self.get_width()
+        flow_field = pathfinder.get_flow_field(
+            world, get_center_tile(target.pos, target.get_width()))
+        next_tile = flow_field.get_next_tile(get_center_tile(self.pos, width))
+        if next_tile is None:
+            destination = target.pos
+        else:
+            destination = path_to_waypoints([next_tile], width)[0]
+        offset = destination - self.pos
+        dist = offset.norm()
+        if not dist:
+            self.velocity.set(0, 0)
+            return
+        if abs(offset.x) >= abs(offset.y):
+            self.facing = Direction.RIGHT if offset.x > 0 else Direction.LEFT
+        else:
+            self.facing = Direction.DOWN if offset.y > 0 else Direction.UP
+        self.velocity.set(offset.x / dist * self.speed,
+                          offset.y / dist * self.speed)
+        # Each axis is stepped on its own so that the Chaser lines up with
+        # a gap between walls at full speed instead of sliding into it.
+        max_step = self.speed * update_ctx.dt
+        offset = Vec(max(-max_step, min(offset.x, max_step)),
+                     max(-max_step, min(offset.y, max_step)))
+        move_and_collide(self, offset, world, world.entities + players)
+
+    def get_bounding_box(self):
+        """Chaser's bounding box is same as player's."""
+        return super().get_bounding_box_of_width(Config.PLAYER_WIDTH)
+
+    def to_json(self, is_to_client):
+        """Convert a Chaser to a dict which can be converted to JSON.
+
+        Args:
+            is_to_client: True to get the version of the entity sent
+                to the client, False to get the version of the entity
+                to save to file.
+        """
+        entity_obj = super().to_json(is_to_client)
+        if not is_to_client:
+            entity_obj["velocity"] = Vec(self.speed, 0).to_json()
+            entity_obj["chase_range"] = self.chase_range
+        return entity_obj
+
+    @staticmethod
+    def from_json(entity_dict):
+        """Convert a dict representing a JSON object into a Chaser."""
+        pos = Vec.from_json(entity_dict["pos"])
+        velocity = Vec.from_json(entity_dict["velocity"])
+        facing = Direction.str_to_direction(entity_dict["facing"])
+        name = entity_dict["name"]
+        chase_range = entity_dict["chase_range"]
+        return Chaser(pos, velocity, facing, name, chase_range)
 
 
 @register_entity("stander")
@@ -200,6 +327,19 @@ class Stander(Entity):
         """Stander's bounding box is same as player's."""
         return super().get_bounding_box_of_width(Config.PLAYER_WIDTH)
 
+    def to_json(self, is_to_client):
+        """Convert a Stander to a dict which can be converted to JSON.
+
+        Args:
+            is_to_client: True to get the version of the entity sent
+                to the client, False to get the version of the entity
+                to save to file.
+        """
+        entity_obj = super().to_json(is_to_client)
+        if not is_to_client:
+            entity_obj["dialogue"] = self.dialogue.to_json()
+        return entity_obj
+
     @staticmethod
     def from_json(entity_dict):
         """Convert a dict representing a JSON object into a Stander."""
@@ -207,5 +347,5 @@ class Stander(Entity):
         velocity = Vec.from_json(entity_dict["velocity"])
         facing = Direction.str_to_direction(entity_dict["facing"])
         name = entity_dict["name"]
-        dialogue = Dialogue.from_json(entity_dict["dialogue"])
+        dialogue = DialogueGraph.from_json(entity_dict["dialogue"])
         return Stander(pos, velocity, facing, name, dialogue)
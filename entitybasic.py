@@ -3,7 +3,7 @@ from collections import namedtuple
 from typing import Any, Dict
 
 from config import Config
-from geometry import BoundingBox, Vec
+from geometry import BoundingBox, MutableVec, Vec
 from tilecoord import TileCoord
 
 
@@ -30,20 +30,66 @@ class Entity:
     """The Entity class encompasses things in the game that can move."""
 
     def __init__(self, pos, velocity, facing, name):
-        """Initialize entity with information given."""
-        self.pos = pos
-        self.velocity = velocity
+        """Initialize entity with information given.
+
+        The position and velocity are copied into MutableVecs, which are
+        updated in place from then on.
+        """
+        self._pos = MutableVec.from_vec(pos)
+        self._velocity = MutableVec.from_vec(velocity)
         self.facing = facing
         self.name = name
         self.blocks_movement = True
+        self.active_set = None
+
+    @property
+    def pos(self):
+        """The entity's position, as a MutableVec.
+
+        Assigning a vector copies its components. Use pos.freeze() to
+        keep a snapshot that does not change when the entity moves.
+        """
+        return self._pos
+
+    @pos.setter
+    def pos(self, new_pos):
+        self._pos.set(new_pos.x, new_pos.y)
+
+    @property
+    def velocity(self):
+        """The entity's velocity, as a MutableVec.
+
+        Assigning a vector copies its components.
+        """
+        return self._velocity
+
+    @velocity.setter
+    def velocity(self, new_velocity):
+        self._velocity.set(new_velocity.x, new_velocity.y)
+        if new_velocity.x or new_velocity.y:
+            self.wake()
+
+    def wake(self):
+        """Make sure the entity is updated every update loop.
+
+        The entity goes back to sleep once is_idle returns True. The
+        active_set is the dict of awake entities that the entity's owner
+        (its World, or the Game for players) gives it.
+        """
+        if self.active_set is not None:
+            self.active_set[self] = None
+
+    def is_idle(self):
+        """Check if updating the entity would do nothing."""
+        return not self._velocity.x and not self._velocity.y
 
     def move(self, offset):
         """Move the entity by the given displacement vector."""
-        self.pos += offset
+        self._pos += offset
 
     def update(self, update_ctx):
         """Update the entity's position. Called every update loop."""
-        self.move(self.velocity * update_ctx.dt)
+        self._pos.add_scaled(self._velocity, update_ctx.dt)
 
     async def on_interact(self, event_ctx):
         """Triggered whenever the player interacts with the entity."""
@@ -51,13 +97,16 @@ class Entity:
     async def on_dialogue_choose(self, event_ctx, choice):
         """Triggered on dialoguechoose (see PROTOCOL.md for details)."""
 
+    async def on_dialogue_end(self, event_ctx):
+        """Triggered whenever a conversation with the entity ends."""
+
     def set_x(self, new_x):
         """Set the entity's x position."""
-        self.pos = Vec(new_x, self.pos.y)
+        self._pos.x = new_x
 
     def set_y(self, new_y):
         """Set the entity's y position."""
-        self.pos = Vec(self.pos.x, new_y)
+        self._pos.y = new_y
 
     def get_bounding_box(self):
         """Get the entity's bounding box."""
@@ -65,8 +114,8 @@ class Entity:
 
     def get_bounding_box_of_width(self, width):
         """Get a bounding box at the current position with a custom width."""
-        block = Vec(width, width)
-        return BoundingBox(self.pos, self.pos + block)
+        x, y = self._pos.x, self._pos.y
+        return BoundingBox(Vec(x, y), Vec(x + width, y + width))
 
     def get_tiles_touched(self):
         """Get the tiles the entity is touching in the form of TileCoords."""
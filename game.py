@@ -1,29 +1,138 @@
 """The Game class handles all of the player objects."""
+from collections import OrderedDict
 
 from battle import Battle
+from config import Config
+from roster import WorldRoster
 from util import Util
+from world import World
 
 
 class Game:
     """The Game class keeps track of players and WebSockets."""
 
     def __init__(self):
-        """There are initially no players in the game."""
-        self.players = []
+        """There are initially no players in the game.
+
+        players maps the usernames of online players to their Player
+        objects, and hibernated does the same for offline players, with
+        the players that have been offline the longest first.
+        """
+        self.players = {}
+        self.hibernated = OrderedDict()
         self.battles = []
+        self.battles_by_username = {}
+        self.active_players = {}
+        self.rosters = {}
 
     def get_player(self, username):
-        """Get the player object associated with the given username."""
-        try:
-            return next(
-                p for p in self.players
-                if p.username == username)
-        except StopIteration:
+        """Get the online player with the given username."""
+        player = self.players.get(username)
+        if player is None:
             raise ValueError
+        return player
 
     def add_player(self, player):
         """Associate the given username with the given player object."""
-        self.players.append(player)
+        self.players[player.username] = player
+        player.active_set = self.active_players
+        player.wake()
+        self.locate_player(player)
+
+    def reconnect_player(self, username, ws):
+        """Get a returning player back online on a new connection.
+
+        A hibernated player is put back into the game as it was left.
+        If the player is still online, the new connection takes over
+        from the old one.
+
+        Args:
+            username: The username of the player.
+            ws: The Session to send the player's messages through.
+
+        Raises:
+            ValueError if no player has the given username.
+        """
+        player = self.players.get(username)
+        if player is None:
+            player = self.hibernated.pop(username, None)
+            if player is None:
+                raise ValueError
+            self.add_player(player)
+        player.ws = ws
+        player.online = True
+        return player
+
+    def hibernate_player(self, player):
+        """Take a player who has gone offline out of the game.
+
+        The player is no longer updated, found by get_player or sent to
+        other players, but is kept in hibernated for reconnect_player.
+        Beyond Config.MAX_HIBERNATED_PLAYERS, the players that have been
+        offline the longest are forgotten, along with their battles.
+        """
+        if self.players.get(player.username) is not player:
+            return
+        del self.players[player.username]
+        self.active_players.pop(player, None)
+        player.active_set = None
+        roster = player.roster
+        if roster is not None:
+            roster.remove(player)
+            self.release_roster(roster)
+        player.ws = None
+        player.online = False
+        self.hibernated[player.username] = player
+        while len(self.hibernated) > Config.MAX_HIBERNATED_PLAYERS:
+            username, _ = self.hibernated.popitem(last=False)
+            self.del_battle_by_username(username)
+
+    def get_roster(self, world_id):
+        """Get the WorldRoster of the world with the given world_id.
+
+        Returns:
+            The WorldRoster, or None if nobody is in the world.
+        """
+        return self.rosters.get(world_id)
+
+    def locate_player(self, player):
+        """Update the rosters after a player has moved or changed worlds.
+
+        This is the only place where rosters are made.
+        """
+        roster = player.roster
+        if roster is not None and roster.world_id != player.world_id:
+            roster.remove(player)
+            self.release_roster(roster)
+        roster = self.rosters.get(player.world_id)
+        if roster is None:
+            roster = WorldRoster(player.world_id)
+            self.rosters[player.world_id] = roster
+        roster.update(player)
+
+    def release_roster(self, roster):
+        """Forget a roster and release its world once nobody is in it.
+
+        Released instances are torn down.
+        """
+        if roster.players or self.rosters.get(roster.world_id) is not roster:
+            return
+        del self.rosters[roster.world_id]
+        World.release_world(roster.world_id)
+
+    def get_players_touching(self, player):
+        """Get the other players in the same world touching a player."""
+        roster = self.get_roster(player.world_id)
+        if roster is None:
+            return []
+        bbox = player.get_bounding_box()
+        return [
+            p for p in roster.get_players_near(
+                bbox.get_left_b() - Config.PLAYER_WIDTH,
+                bbox.get_top_b() - Config.PLAYER_WIDTH,
+                bbox.get_right_b(),
+                bbox.get_bottom_b())
+            if p is not player and p.is_touching(player)]
 
     def player_in_battle(self, username):
         """Check if a player is in a battle."""
@@ -33,28 +142,33 @@ class Game:
 
     def get_players_by_world(self, world_id):
         """Get all the players in the game with the given world_id."""
-        return [p for p in self.players if p.world_id == world_id]
+        roster = self.get_roster(world_id)
+        if roster is None:
+            return []
+        return roster.get_players()
+
+    def get_inhabited_world_ids(self):
+        """Get the world_ids of the worlds that have a player in them."""
+        return [world_id for world_id, roster in self.rosters.items()
+                if roster.players]
 
     def get_battle_by_username(self, username):
         """Get the battle that the player with the given username is in."""
-        combatant_id = self.get_player(username).combatant_id
-        for battle in self.battles:
-            if battle.has_combatant(combatant_id):
-                return battle
-        return None
+        return self.battles_by_username.get(username)
 
     def del_battle_by_username(self, username):
         """Delete the battle that the player with the given username is in."""
-        combatant_id = self.get_player(username).combatant_id
-        self.battles = [b for b in self.battles
-                        if not b.has_combatant(combatant_id)]
+        battle = self.battles_by_username.pop(username, None)
+        if battle is not None:
+            self.battles.remove(battle)
 
     async def create_battle(self, username, ws, player, ai):
         """Create a battle with the given player and AI."""
         if self.player_in_battle(username):
             raise ValueError
-        battle = Battle([player], [ai])
+        battle = Battle([player], [ai], player.rng)
         self.battles.append(battle)
+        self.battles_by_username[username] = battle
         c_id = player.combatant_id
         await Util.send_battle_start(ws, c_id.side)
         await Util.send_battle_status(ws, battle, c_id.side)
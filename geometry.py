@@ -1,4 +1,4 @@
-"""Defines the Vec, Direction, and BoundingBox classes."""
+"""Defines the Vec, MutableVec, Direction, and BoundingBox classes."""
 from collections import namedtuple
 from enum import Enum
 import math
@@ -64,6 +64,113 @@ class Vec(namedtuple("Vec", ["x", "y"])):
         return {"x": self.x, "y": self.y}
 
 
+class MutableVec:
+    """The MutableVec class represents a 2D vector that changes in place.
+
+    Entities store their position and velocity as MutableVecs so that
+    moving does not allocate a new Vec on every update. Arithmetic
+    operators still return new Vecs; use freeze() to get a Vec snapshot
+    that is safe to keep after the MutableVec changes.
+    """
+
+    __slots__ = ("x", "y")
+
+    def __init__(self, x, y):
+        """Initialize with the x- and y-components."""
+        self.x = x
+        self.y = y
+
+    @staticmethod
+    def from_vec(vec):
+        """Create a MutableVec with the same components as vec."""
+        return MutableVec(vec.x, vec.y)
+
+    def set(self, x, y):
+        """Set both components."""
+        self.x = x
+        self.y = y
+
+    def set_vec(self, other):
+        """Set both components to those of another vector."""
+        self.x = other.x
+        self.y = other.y
+
+    def add_scaled(self, other, scalar):
+        """Add another vector multiplied by a scalar, in place."""
+        self.x += other.x * scalar
+        self.y += other.y * scalar
+
+    def freeze(self):
+        """Get an immutable Vec with the current components."""
+        return Vec(self.x, self.y)
+
+    def __iadd__(self, other):
+        """Add another vector in place."""
+        self.x += other.x
+        self.y += other.y
+        return self
+
+    def __isub__(self, other):
+        """Subtract another vector in place."""
+        self.x -= other.x
+        self.y -= other.y
+        return self
+
+    def __add__(self, other):
+        """Add another vector."""
+        return Vec(self.x + other.x, self.y + other.y)
+
+    def __sub__(self, other):
+        """Subtract another vector."""
+        return Vec(self.x - other.x, self.y - other.y)
+
+    def __mul__(self, scalar):
+        """Multiply a vector by a scalar."""
+        return Vec(self.x * scalar, self.y * scalar)
+
+    def __iter__(self):
+        """Iterate over the components, so that x, y = vec works."""
+        yield self.x
+        yield self.y
+
+    def __eq__(self, other):
+        """Compare components with another vector."""
+        try:
+            return self.x == other.x and self.y == other.y
+        except AttributeError:
+            return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        """Get a readable representation of the vector."""
+        return f"MutableVec(x={self.x!r}, y={self.y!r})"
+
+    def relative_to(self, other):
+        """Get the displacement vector from other to self."""
+        return Vec(self.x - other.x, self.y - other.y)
+
+    def dist_to(self, other):
+        """Get the distance to another vector."""
+        return math.hypot(self.x - other.x, self.y - other.y)
+
+    def norm(self):
+        """Get the magnitude of a vector, i.e. the distance to the origin."""
+        return math.hypot(self.x, self.y)
+
+    def angle_to(self, other):
+        """Get the angle between self and other.
+
+        Returns:
+            An angle in radians from -pi to pi, measured from the +x axis.
+        """
+        return math.atan2(self.y - other.y, other.x - self.x)
+
+    def to_json(self):
+        """Convert a MutableVec into a dict representing a JSON object."""
+        return {"x": self.x, "y": self.y}
+
+
 class Direction(Enum):
     """Enum representing the four cardinal directions."""
 
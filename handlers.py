@@ -0,0 +1,226 @@
+"""Defines the MessageHandlers of the messages sent to the server.
+
+See PROTOCOL.md for what each message does.
+"""
+from collections import namedtuple
+import asyncio
+import time
+import uuid
+
+from battle import MoveChoice
+from collision import move_and_collide
+from config import Config
+from dialogue import end_player_conversation
+from geometry import Direction, Vec
+from portals import prefetch_near
+from router import MessageHandler, register_handler
+from util import Util
+from world import World
+
+
+MoveCommand = namedtuple("MoveCommand", ["direction", "multiplier"])
+InteractCommand = namedtuple("InteractCommand", [])
+GetUpdatesCommand = namedtuple("GetUpdatesCommand", [])
+WorldCacheCommand = namedtuple("WorldCacheCommand", ["world_hashes"])
+DialogueChooseCommand = namedtuple("DialogueChooseCommand", [
+    "entity_name",
+    "choice"
+])
+BattleMoveCommand = namedtuple("BattleMoveCommand", [
+    "combatant_uuid",
+    "move_index",
+    "target_uuid"
+])
+
+
+@register_handler("move", "fastmove")
+class MoveHandler(MessageHandler):
+    """Moves the player and triggers the tiles moved onto."""
+
+    def parse(self, verb, params):
+        """Parse the direction letters of a move or fastmove message."""
+        direction = params[0]
+        if not direction or any(char not in "lrud" for char in direction):
+            raise ValueError
+        multiplier = 1
+        if verb == "fastmove":
+            multiplier = Config.SPEED_MULTIPLIER
+        return MoveCommand(direction=direction, multiplier=multiplier)
+
+    async def handle(self, connection, command):
+        """Move the player in the direction given.
+
+        The worlds of portals near where the player ends up are
+        prefetched in the background once the player has been told
+        where that is.
+        """
+        player = connection.player
+        if player.conversation:
+            return
+        dir_vec = sum([
+            Vec.vec_from_direction_str(char)
+            for char in set(command.direction)], Vec(0, 0))
+        world = connection.get_world()
+        player.facing = Direction.str_to_direction(command.direction[-1])
+        start_pos = player.pos.freeze()
+        start_tiles = player.get_tiles_touched()
+        now = time.monotonic()
+        dt = min(now - player.time_of_last_move, Config.MAX_MOVE_DT)
+        player.time_of_last_move = now
+        offset = dir_vec * (Config.PLAYER_SPEED * dt * command.multiplier)
+        move_and_collide(player, offset, world, world.entities)
+        connection.game.locate_player(player)
+        tile_coords_moved_on = [
+            tile_coord for tile_coord in player.get_tiles_touched()
+            if tile_coord in world.move_on_triggers
+            and tile_coord not in start_tiles]
+        for tile_coord in tile_coords_moved_on:
+            tile_moved_on = world.get_tile(tile_coord)
+            await tile_moved_on.on_move_on(
+                connection.get_tile_event_context(tile_coord.to_pos()),
+                start_pos)
+        await Util.send_moved_to(connection.ws, player.pos)
+        asyncio.ensure_future(
+            prefetch_near(connection.get_world(), player.pos))
+
+
+@register_handler("interact")
+class InteractHandler(MessageHandler):
+    """Interacts with what the player is talking to or touching."""
+
+    def parse(self, verb, params):
+        """An interact message has no parameters."""
+        del verb, params  # Unused
+        return InteractCommand()
+
+    async def handle(self, connection, command):
+        """Interact with tiles, entities and other players."""
+        del command  # Unused
+        player = connection.player
+        if player.conversation:
+            await player.conversation.entity.on_interact(
+                connection.get_entity_event_context())
+            return
+        world = connection.get_world()
+        for tile_coord in player.get_tiles_touched():
+            if tile_coord not in world.interact_triggers:
+                continue
+            tile_interacted = world.get_tile(tile_coord)
+            await tile_interacted.on_interact(
+                connection.get_tile_event_context(tile_coord.to_pos()))
+        for entity_interacted in player.get_entities_can_interact(world):
+            await entity_interacted.on_interact(
+                connection.get_entity_event_context())
+        await asyncio.gather(*(
+            Util.send_tag(connection.game, connection.username,
+                          player_touching.username)
+            for player_touching in connection.game.get_players_touching(
+                player)))
+
+
+@register_handler("getupdates")
+class GetUpdatesHandler(MessageHandler):
+    """Sends the other players and the entities in the player's world."""
+
+    def parse(self, verb, params):
+        """A getupdates message has no parameters."""
+        del verb, params  # Unused
+        return GetUpdatesCommand()
+
+    async def handle(self, connection, command):
+        """Send the players and entities messages."""
+        del command  # Unused
+        await Util.send_players(connection.game, connection.ws,
+                                connection.username,
+                                connection.player.world_id)
+        await Util.send_entities(connection.ws, connection.get_world())
+
+
+@register_handler("worldcache")
+class WorldCacheHandler(MessageHandler):
+    """Records the hashes of the worlds the client has cached."""
+
+    allowed_in_battle = True
+
+    def parse(self, verb, params):
+        """Parse the world hashes, skipping empty ones."""
+        del verb  # Unused
+        return WorldCacheCommand(
+            world_hashes=set(world_hash for world_hash in params
+                             if world_hash))
+
+    async def handle(self, connection, command):
+        """Replace the player's world cache."""
+        connection.player.world_cache = command.world_hashes
+
+
+@register_handler("dialoguechoose")
+class DialogueChooseHandler(MessageHandler):
+    """Passes the player's dialogue choice to the entity spoken to."""
+
+    def parse(self, verb, params):
+        """Parse the entity name and the index of the choice."""
+        del verb  # Unused
+        return DialogueChooseCommand(
+            entity_name=params[0],
+            choice=int(params[1]))
+
+    async def handle(self, connection, command):
+        """Tell the entity which choice was made."""
+        try:
+            entity_speaking_to = connection.get_world().get_entity(
+                command.entity_name)
+            await entity_speaking_to.on_dialogue_choose(
+                connection.get_entity_event_context(), command.choice)
+        except ValueError:
+            pass
+
+
+@register_handler("battlemove")
+class BattleMoveHandler(MessageHandler):
+    """Makes the player's move in the battle the player is in."""
+
+    allowed_in_battle = True
+
+    def parse(self, verb, params):
+        """Parse the combatant's UUID, the move index and the target."""
+        del verb  # Unused
+        return BattleMoveCommand(
+            combatant_uuid=uuid.UUID(params[0]),
+            move_index=int(params[1]),
+            target_uuid=uuid.UUID(params[2]))
+
+    async def handle(self, connection, command):
+        """Process the move and send the outcome of the turn."""
+        battle = connection.get_battle()
+        if not battle:
+            return
+        player = connection.player
+        ws = connection.ws
+        c_id = player.combatant_id
+        try:
+            if command.combatant_uuid != c_id.combatant_uuid:
+                raise ValueError
+            move = player.moves[command.move_index]
+            move_choice = MoveChoice(
+                move,
+                battle.get_combatant_id_by_uuid(command.target_uuid))
+            winning_side = battle.process_player_move(move_choice)
+        except (ValueError, IndexError):
+            return
+        if not winning_side:
+            await Util.send_move_request(ws, c_id.combatant_uuid)
+            await Util.send_battle_status(ws, battle, c_id.side)
+        elif winning_side is c_id.side:
+            await Util.send_battle_end(ws)
+            connection.game.del_battle_by_username(connection.username)
+        else:
+            await Util.send_battle_end(ws)
+            await Util.send_death(ws)
+            connection.game.del_battle_by_username(connection.username)
+            await end_player_conversation(connection.game, player)
+            player.respawn()
+            connection.game.locate_player(player)
+            await Util.send_world(
+                ws, World.get_world_by_id(player.world_id), player.pos,
+                player.world_cache)
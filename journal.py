@@ -0,0 +1,228 @@
+"""Defines WorldJournal, which saves the changes made to worlds.
+
+Rather than writing a whole world to file each time it changes, each
+change is appended to the world's journal as one JSON line: a tile that
+was set, or the saved state of an entity that moved or changed. Changes
+are buffered and written together every Config.JOURNAL_FLUSH_DT seconds
+with a single fsync, off the event loop, so saving costs about as much
+as what changed. Once a journal grows past Config.JOURNAL_COMPACT_SIZE
+bytes, the world is written to a snapshot and the journal is emptied.
+
+Snapshots and journals live in Config.SAVE_DIR, never in the worlds
+folder. When the server starts, a world is loaded from its snapshot if
+it has one, and its journal is replayed on top. Instances of instanced
+worlds are not journaled, and neither is where players are in their
+conversations, which is not part of the world.
+"""
+import asyncio
+import os
+import threading
+from typing import Dict
+
+from config import Config
+from serializer import dumps, loads
+from storeworld import world_to_save_json
+from tilebasic import Tile
+from tilecoord import TileCoord
+
+
+_journals: Dict[str, "WorldJournal"] = {}  # Maps world_ids to journals.
+
+
+def get_snapshot_path(world_id):
+    """Get the path of the snapshot of a world."""
+    return os.path.join(Config.SAVE_DIR, f"{world_id}.json")
+
+
+def get_journal_path(world_id):
+    """Get the path of the journal of a world."""
+    return os.path.join(Config.SAVE_DIR, f"{world_id}.journal")
+
+
+class WorldJournal:
+    """The journal of changes to one World since its last snapshot.
+
+    Tile changes are recorded by World.set_tile as they are made. The
+    entities are compared with their last recorded state when the
+    journal is flushed, but only those that were awake then or at the
+    last flush, since only awake entities change.
+    """
+
+    def __init__(self, world):
+        """Start a journal for a world, with nothing yet to write."""
+        self.world = world
+        world_id = world.get_world_id()
+        self.snapshot_path = get_snapshot_path(world_id)
+        self.journal_path = get_journal_path(world_id)
+        self.file = None
+        self.size = 0
+        if os.path.exists(self.journal_path):
+            self.size = os.path.getsize(self.journal_path)
+        self.records = []
+        self.entity_states = {
+            entity.name: dumps(entity.to_json(False))
+            for entity in world.entities}
+        self.awake_entities = set(world.active_entities)
+        self.file_lock = threading.Lock()
+
+    def record_tile(self, tile_coord, tile):
+        """Record that the tile at a TileCoord was set."""
+        self.records.append(dumps({
+            "type": "tile",
+            "block_x": tile_coord.block_x,
+            "block_y": tile_coord.block_y,
+            "tile": tile.to_json(False)
+        }))
+
+    def record_entities(self):
+        """Record the entities which have changed since the last flush."""
+        awake_entities = set(self.world.active_entities)
+        for entity in awake_entities | self.awake_entities:
+            entity_state = dumps(entity.to_json(False))
+            if self.entity_states.get(entity.name) != entity_state:
+                self.entity_states[entity.name] = entity_state
+                self.records.append(
+                    f'{{"type":"entity","entity":{entity_state}}}')
+        self.awake_entities = awake_entities
+
+    def take_batch(self):
+        """Get the records not yet written, as bytes, and forget them."""
+        self.record_entities()
+        if not self.records:
+            return b""
+        batch = ("\n".join(self.records) + "\n").encode()
+        self.records = []
+        return batch
+
+    def needs_compaction(self):
+        """Check if the journal has grown enough to be snapshotted."""
+        return self.size >= Config.JOURNAL_COMPACT_SIZE
+
+    def write_batch(self, batch):
+        """Append a batch of records to the journal and fsync it once."""
+        with self.file_lock:
+            if self.file is None:
+                self.file = open(self.journal_path, "ab")
+            self.file.write(batch)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.size += len(batch)
+
+    def write_snapshot(self, snapshot):
+        """Replace the world's snapshot and empty the journal.
+
+        The snapshot is written to a temporary file first, so that the
+        old snapshot stays whole if the server stops halfway.
+        """
+        temp_path = self.snapshot_path + ".tmp"
+        with self.file_lock:
+            with open(temp_path, "wb") as file:
+                file.write(snapshot.encode())
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.snapshot_path)
+            if self.file is None:
+                self.file = open(self.journal_path, "ab")
+            self.file.truncate(0)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.size = 0
+
+    def take_snapshot(self):
+        """Get the world's snapshot, counting its entities as recorded."""
+        self.records = []
+        self.entity_states = {
+            entity.name: dumps(entity.to_json(False))
+            for entity in self.world.entities}
+        self.awake_entities = set(self.world.active_entities)
+        return world_to_save_json(self.world)
+
+    async def flush(self):
+        """Write the changes since the last flush without blocking.
+
+        Whatever is written is taken from the world first, so changes
+        made while the file is being written wait for the next flush.
+        """
+        loop = asyncio.get_event_loop()
+        if self.needs_compaction():
+            await loop.run_in_executor(
+                None, self.write_snapshot, self.take_snapshot())
+            return
+        batch = self.take_batch()
+        if batch:
+            await loop.run_in_executor(None, self.write_batch, batch)
+
+    def close(self):
+        """Snapshot the world if it has changed, and close the journal."""
+        if self.take_batch() or self.size:
+            self.write_snapshot(self.take_snapshot())
+        with self.file_lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+def replay_journal(world, journal_path):
+    """Apply the records in a journal to a world.
+
+    Every record ends with a newline, so a last record that does not
+    was cut short by the server stopping while it was written, and is
+    left out. A record that cannot be applied ends the replay.
+
+    Returns:
+        The number of records applied.
+    """
+    with open(journal_path, "rb") as file:
+        complete_records, _, _ = file.read().rpartition(b"\n")
+    if not complete_records:
+        return 0
+    replayed = 0
+    for line in complete_records.split(b"\n"):
+        try:
+            record = loads(line)
+            if record["type"] == "tile":
+                world.set_tile(
+                    TileCoord(record["block_x"], record["block_y"]),
+                    Tile.from_json(record["tile"]))
+            elif record["type"] == "entity":
+                world.replace_entity(record["entity"])
+            else:
+                raise ValueError
+        except (ValueError, KeyError, TypeError):
+            break
+        replayed += 1
+    return replayed
+
+
+def open_journal(world):
+    """Replay a world's journal, then start journaling its changes.
+
+    A journal that is not empty is compacted straight away, so that new
+    records are not appended after one that was cut short.
+    """
+    os.makedirs(Config.SAVE_DIR, exist_ok=True)
+    journal_path = get_journal_path(world.get_world_id())
+    if os.path.exists(journal_path):
+        replay_journal(world, journal_path)
+    journal = WorldJournal(world)
+    if journal.size:
+        journal.write_snapshot(journal.take_snapshot())
+    world.journal = journal
+    _journals[world.get_world_id()] = journal
+    return journal
+
+
+async def flush_journals(dt):
+    """Flush every journal, every Config.JOURNAL_FLUSH_DT seconds.
+
+    Run by a Ticker, which gives the time since the last flush as dt.
+    """
+    del dt  # Unused
+    for journal in list(_journals.values()):
+        await journal.flush()
+
+
+def close_journals():
+    """Snapshot every journaled world, e.g. when the server stops."""
+    for journal in _journals.values():
+        journal.close()
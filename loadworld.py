@@ -1,23 +1,37 @@
 """Defines functions to load worlds from file."""
-import json
 import os
 
+from journal import get_snapshot_path, open_journal
+from portals import check_portal_links
+from serializer import loads
 from world import World
 
 
 def load_world(world_id, world_dict):
     """Register a world given by world_dict with the given world_id."""
-    World.register_world(world_id, World.from_json(world_dict))
+    world = World.from_json(world_dict)
+    World.register_world(world_id, world)
+    return world
 
 
 def load_file(world_id):
-    """Register the world with the given world_id from a JSON file."""
-    with open(f"worlds/{world_id}.json") as file:
-        load_world(world_id, json.load(file))
+    """Register the world with the given world_id from a JSON file.
+
+    The world is loaded from its saved snapshot if it has one, and
+    changes to it are journaled unless it is instanced.
+    """
+    path = get_snapshot_path(world_id)
+    if not os.path.exists(path):
+        path = f"worlds/{world_id}.json"
+    with open(path, "rb") as file:
+        world = load_world(world_id, loads(file.read()))
+    if not world.instanced:
+        open_journal(world)
 
 
 def load_worlds():
-    """Register all worlds in the folder."""
+    """Register all worlds in the folder, then check their portals."""
     with os.scandir("worlds") as files:
         for entry in files:
             load_file(entry.name[:-5])
+    check_portal_links()
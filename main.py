@@ -2,30 +2,41 @@
 import asyncio
 from signal import signal, SIGINT
 import sys
-import time
-import uuid
 import websockets
 from websockets.exceptions import ConnectionClosed
 
-from battle import MoveChoice
-from collision import block_movement
+from admission import AdmissionControl
+from compression import ServerDeflateFactory
 from config import Config
-from entitybasic import EntityEventContext, EntityUpdateContext
+from dialogue import end_player_conversation, run_conversation_timeouts
 import game
+from journal import close_journals, flush_journals
 from geometry import Direction, Vec
 from player import Player
-from tilebasic import Tile, TileEventContext
+from recording import TrafficRecorder
+from router import Connection, MessageRouter
+from scheduler import UpdateScheduler
+from session import SessionStore
+from ticker import CatchUp, Ticker
 from util import Util
 from world import World
 from loadworld import load_worlds
 
 import entity  # Just to register the entities declared in entity.py
 import tile  # Just to register the tiles declared in tile.py
+import handlers  # Just to register the handlers declared in handlers.py
 del entity
 del tile
+del handlers
 
 
 running_game = game.Game()
+admission = AdmissionControl()
+router = MessageRouter()
+sessions = SessionStore()
+recorder = None
+if Config.RECORD_PATH:
+    recorder = TrafficRecorder(Config.RECORD_PATH)
 
 
 load_worlds()
@@ -34,221 +45,118 @@ load_worlds()
 async def run(ws, path):
     """Run the WebSocket server."""
     del path  # Unused
+    limiter = admission.connect()
+    if limiter is None:
+        await ws.close(1013, "Server is full")
+        return
+    connection_id = None
+    if recorder:
+        connection_id = recorder.open_connection()
+    try:
+        await handle_connection(ws, limiter, connection_id)
+    finally:
+        admission.disconnect()
+        if recorder:
+            recorder.close_connection(connection_id)
+
+
+async def handle_connection(ws, limiter, connection_id):
+    """Handle an admitted connection until it closes.
+
+    When the connection closes, or stops answering pings, the player
+    is hibernated until the next time the user connects. A client that
+    resumes its session is only sent the messages it missed. Messages
+    are recorded under connection_id if traffic is being recorded.
+    """
     try:
-        username = await ws.recv()
+        login = await ws.recv()
     except ConnectionClosed:
         return
+    if recorder:
+        recorder.record_message(connection_id, login)
+    session = missed = None
+    if login.startswith("resume|"):
+        try:
+            _, username, token, received_count = login.split("|")
+            session, missed = sessions.resume(
+                username, token, int(received_count))
+        except ValueError:
+            return
+    else:
+        username = login
+    if session is None:
+        session = sessions.create(username)
     try:
-        player = running_game.get_player(username)
+        player = running_game.reconnect_player(username, session)
         print("Returning user: " + username)
-        print("Connecting from: "
-              + ws.remote_address[0] + ":" + str(ws.remote_address[1]))
-        player.ws = ws
-        player.online = True
-        world = World.get_world_by_id(player.world_id)
-        await Util.send_world(ws, world, player.pos)
-        if running_game.player_in_battle(username):
-            battle = running_game.get_battle_by_username(username)
-            c_id = player.combatant_id
-            await Util.send_battle_start(ws, c_id.side)
-            await Util.send_battle_status(ws, battle, c_id.side)
-            await Util.send_move_request(ws, c_id.combatant_uuid)
     except ValueError:
         print("New user: " + username)
-        print("Connecting from: "
-              + ws.remote_address[0] + ":" + str(ws.remote_address[1]))
         world_id = "starting_world"
         spawn_id = "center_spawn"
         world = World.get_world_by_id(world_id)
         spawn_pos = world.spawn_points[spawn_id].to_spawn_pos()
-        player = Player(
-            username, spawn_pos, Vec(0, 0), Direction.DOWN, ws, world_id)
+        player = Player(username, spawn_pos, Vec(0, 0), Direction.DOWN,
+                        session, world_id)
         running_game.add_player(player)
-        await Util.send_world(ws, world, spawn_pos)
+        missed = None
+    print("Connecting from: "
+          + ws.remote_address[0] + ":" + str(ws.remote_address[1]))
     try:
+        if missed is not None:
+            await session.resume(ws, missed)
+        else:
+            player.world_cache = None
+            await session.start(ws)
+            await Util.send_world(
+                session, World.get_world_by_id(player.world_id), player.pos)
+            battle = running_game.get_battle_by_username(username)
+            if battle:
+                c_id = player.combatant_id
+                await Util.send_battle_start(session, c_id.side)
+                await Util.send_battle_status(session, battle, c_id.side)
+                await Util.send_move_request(session, c_id.combatant_uuid)
+        connection = Connection(running_game, session, player)
         async for message in ws:
-            await parseMessage(message, username, ws)
+            if recorder:
+                recorder.record_message(connection_id, message)
+            verb, _, params = message.partition("|")
+            if admission.admit(limiter, verb):
+                await router.route(connection, verb, params)
     except ConnectionClosed:
-        player.online = False
+        pass
+    finally:
+        if player.ws is session and sessions.detach(session, ws):
+            await end_player_conversation(running_game, player)
+            running_game.hibernate_player(player)
 
 
-async def parseMessage(message, username, ws):
-    """Handle a message from a client."""
-    player = running_game.get_player(username)
-    world = World.get_world_by_id(player.world_id)
-    if message.startswith("move|") or message.startswith("fastmove|"):
-        if running_game.player_in_battle(username) or player.talking_to:
-            return
-        multiplier = 1
-        if message.startswith("fastmove|"):
-            multiplier = Config.SPEED_MULTIPLIER
-        parts = message.split("|")
-        direction = parts[1]
-        dir_vec = sum([
-            Vec.vec_from_direction_str(char)
-            for char in set(direction)], Vec(0, 0))
-        if dir_vec:
-            player.facing = Direction.str_to_direction(direction[-1])
-            start_pos = player.pos
-            start_tiles = player.get_tiles_touched()
-            now = time.monotonic()
-            dt = min(now - player.time_of_last_move, Config.MAX_MOVE_DT)
-            player.time_of_last_move = now
-            offset = dir_vec * (Config.PLAYER_SPEED * dt * multiplier)
-            player.pos += offset
-            tile_coords_touching = player.get_tiles_touched()
-            wall_tiles = [
-                tile_coord for tile_coord in tile_coords_touching
-                if world.get_tile(tile_coord).blocks_movement]
-            if wall_tiles:
-                wall_tiles = [tile_coord.to_pos() for tile_coord in wall_tiles]
-                wall_tiles.sort(
-                    key=lambda tile_pos:
-                    tile_pos.dist_to(player.pos))
-                for wall_tile in wall_tiles:
-                    block_movement(Tile.get_bounding_box(wall_tile),
-                                   start_pos, player)
-                tile_coords_touching = player.get_tiles_touched()
-            wall_entities = [
-                entity for entity in world.entities
-                if entity.blocks_movement
-                and player.is_touching(entity)]
-            if wall_entities:
-                wall_entities.sort(
-                    key=lambda wall_entity:
-                    wall_entity.pos.dist_to(player.pos))
-                for wall_entity in wall_entities:
-                    block_movement(wall_entity.get_bounding_box(),
-                                   start_pos, player)
-            tile_coords_moved_on = [
-                tile_coord for tile_coord in tile_coords_touching
-                if tile_coord not in start_tiles]
-            for tile_coord in tile_coords_moved_on:
-                tile_moved_on = world.get_tile(tile_coord)
-                await tile_moved_on.on_move_on(TileEventContext(
-                    game=running_game,
-                    ws=ws,
-                    username=username,
-                    world=world,
-                    player=player,
-                    tile_pos=tile_coord.to_pos()), start_pos)
-            await Util.send_moved_to(ws, player.pos)
-    elif message.startswith("interact"):
-        if running_game.player_in_battle(username):
-            return
-        if player.talking_to:
-            await player.talking_to.on_interact(EntityEventContext(
-                game=running_game,
-                ws=ws,
-                username=username,
-                world=world,
-                player=player))
-        else:
-            for tile_coord in player.get_tiles_touched():
-                tile_interacted = world.get_tile(tile_coord)
-                await tile_interacted.on_interact(TileEventContext(
-                    game=running_game,
-                    ws=ws,
-                    username=username,
-                    world=world,
-                    player=player,
-                    tile_pos=tile_coord.to_pos()))
-            for entity_interacted in player.get_entities_can_interact(world):
-                await entity_interacted.on_interact(EntityEventContext(
-                    game=running_game,
-                    ws=ws,
-                    username=username,
-                    world=world,
-                    player=player))
-            for player_in_game in running_game.players:
-                if (player_in_game.world_id == player.world_id
-                        and player_in_game.is_touching(player)
-                        and player_in_game.username != username):
-                    await Util.send_tag(
-                        running_game, username, player_in_game.username)
-    elif message.startswith("getupdates"):
-        if running_game.player_in_battle(username):
-            return
-        await Util.send_players(running_game, ws, username, player.world_id)
-        await Util.send_entities(ws, world)
-    elif message.startswith("dialoguechoose"):
-        if running_game.player_in_battle(username):
-            return
-        parts = message.split("|")
-        entity_name = parts[1]
-        entity_speaking_to = world.get_entity(entity_name)
-        try:
-            await entity_speaking_to.on_dialogue_choose(EntityEventContext(
-                game=running_game,
-                ws=ws,
-                username=username,
-                world=world,
-                player=player
-            ), int(parts[2]))
-        except ValueError:
-            pass
-    elif message.startswith("battlemove"):
-        battle = running_game.get_battle_by_username(username)
-        if not battle:
-            return
-        parts = message.split("|")
-        try:
-            combatant_uuid = uuid.UUID(parts[1])
-            if combatant_uuid != player.combatant_id.combatant_uuid:
-                raise ValueError
-            move = player.moves[int(parts[2])]
-            target_uuid = uuid.UUID(parts[3])
-            move_choice = MoveChoice(
-                move,
-                battle.get_combatant_id_by_uuid(target_uuid))
-            winning_side = battle.process_player_move(move_choice)
-            c_id = player.combatant_id
-            if not winning_side:
-                await Util.send_move_request(ws, c_id.combatant_uuid)
-                await Util.send_battle_status(ws, battle, c_id.side)
-            elif winning_side is c_id.side:
-                await Util.send_battle_end(ws)
-                running_game.del_battle_by_username(username)
-            else:
-                await Util.send_battle_end(ws)
-                await Util.send_death(ws)
-                running_game.del_battle_by_username(username)
-                player.respawn()
-                await Util.send_world(
-                    ws, World.get_world_by_id(player.world_id), player.pos)
-        except ValueError:
-            pass
+scheduler = UpdateScheduler(running_game)
+
+
+def update_entities(dt):
+    """Update entities in player-inhabited worlds."""
+    scheduler.tick(dt)
+    scheduler.maybe_print_report()
 
 
-async def update_loop():
-    """Update entities in player-inhabited worlds in an infinite loop."""
-    then = time.monotonic()
-    while True:
-        now = time.monotonic()
-        dt = now - then
-        then = now
-        for world_id in set(
-                p.world_id for p in running_game.players):
-            world = World.get_world_by_id(world_id)
-            for ent in world.entities:
-                ent.update(EntityUpdateContext(
-                    game=running_game,
-                    world=world,
-                    dt=dt))
-        for player in running_game.players:
-            player.update(EntityUpdateContext(
-                game=running_game,
-                world=World.get_world_by_id(player.world_id),
-                dt=dt))
-        await asyncio.sleep(Config.UPDATE_DT)
+update_ticker = Ticker("update", Config.UPDATE_DT, update_entities,
+                       CatchUp(Config.UPDATE_CATCH_UP))
+journal_ticker = Ticker("journal", Config.JOURNAL_FLUSH_DT, flush_journals)
 
-start_server = websockets.serve(run, "0.0.0.0", Config.WSPORT)
+start_server = websockets.serve(run, "0.0.0.0", Config.WSPORT,
+                                compression=None,
+                                extensions=[ServerDeflateFactory()],
+                                ping_interval=Config.PING_INTERVAL,
+                                ping_timeout=Config.PING_TIMEOUT)
 
 
 def cleanup(sig, frame):
     """Handle a SIG_INTERRUPT, i.e. when Ctrl+C is pressed."""
     del sig, frame  # Unused
     print("Exiting...")
+    close_journals()
+    if recorder:
+        recorder.close()
     sys.exit(0)
 
 
@@ -257,6 +165,13 @@ signal(SIGINT, cleanup)
 
 print("WebSocket server starting! Press CTRL-C to exit.")
 loop = asyncio.get_event_loop()
-loop.create_task(update_loop())
+loop.create_task(update_ticker.run())
+loop.create_task(update_ticker.run_reports())
+loop.create_task(admission.run_lag_monitor())
+loop.create_task(admission.run_reports())
+loop.create_task(router.run_reports())
+loop.create_task(run_conversation_timeouts(running_game))
+loop.create_task(journal_ticker.run())
+loop.create_task(journal_ticker.run_reports())
 loop.run_until_complete(start_server)
 loop.run_forever()
@@ -0,0 +1,61 @@
+"""Defines get_client_hash, which hashes worlds off the event loop.
+
+The first time a world is sent after it loads or changes, every chunk
+of it is encoded to compute its client hash (see world_client_hash in
+storeworld.py), which takes milliseconds for large worlds. Worlds with
+at least Config.OFFLOAD_MIN_TILES tiles are hashed by a pool of
+Config.SERIALIZE_WORKERS threads instead, so that the event loop can
+keep handling other players' messages in the meantime. Players sent the
+same world at once, e.g. when many teleport together, wait for one
+shared job, and the result is cached on the world as usual.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict
+
+from config import Config
+from storeworld import compute_client_hash, world_client_hash
+
+
+_executor = ThreadPoolExecutor(Config.SERIALIZE_WORKERS,
+                               thread_name_prefix="serialize")
+
+_jobs: Dict[Any, Any] = {}  # Maps Worlds to the futures hashing them.
+
+
+def is_heavy(world):
+    """Check if a world is big enough to be hashed off the event loop."""
+    return world.get_width() * world.get_height() >= Config.OFFLOAD_MIN_TILES
+
+
+async def get_client_hash(world):
+    """Get the client hash of a world, hashing big worlds in the pool.
+
+    See world_client_hash for the hash itself.
+    """
+    if world.client_hash is not None or not is_heavy(world):
+        return world_client_hash(world)
+    job = _jobs.get(world)
+    if job is None:
+        job = asyncio.ensure_future(hash_in_pool(world))
+        _jobs[world] = job
+        job.add_done_callback(lambda _: _jobs.pop(world, None))
+    return await asyncio.shield(job)
+
+
+async def hash_in_pool(world):
+    """Hash a world in the pool and cache the result on the world.
+
+    The chunks are encoded into a copy of the world's client_chunks. If
+    the world changes meanwhile, the result is thrown away and the world
+    is hashed again on the event loop.
+    """
+    client_version = world.client_version
+    chunk_strs = dict(world.client_chunks)
+    world_hash = await asyncio.get_event_loop().run_in_executor(
+        _executor, compute_client_hash, world, chunk_strs)
+    if world.client_version != client_version:
+        return world_client_hash(world)
+    world.client_chunks.update(chunk_strs)
+    world.client_hash = world_hash
+    return world_hash
@@ -0,0 +1,475 @@
+"""Defines the pathfinding service that entities and cutscenes use.
+
+Paths are found with A* over a grid of which tiles are walkable, moving
+in eight directions without cutting the corners of unwalkable tiles.
+Searches are run a few nodes at a time by Pathfinder.step, which the
+UpdateScheduler calls every tick, so that many entities can look for
+paths at once without blocking the event loop.
+
+Finished searches are cached per world by their start and goal tiles.
+
+For many entities heading to the same place, a FlowField holds the
+distance to one goal from every tile of a world, so each entity only
+has to look up the next tile to step to. Flow fields are kept per world
+for the Config.FLOW_FIELD_CACHE_SIZE most recently used goals.
+
+When tiles change, World.invalidate_navigation tells the Pathfinder
+which ones. The walkability grid is patched, flow fields are repaired
+around the changed tiles, and cached searches are thrown away. If the
+changed tiles are not known, everything is rebuilt.
+"""
+from collections import OrderedDict, deque
+import heapq
+from typing import Any, Dict
+
+from config import Config
+from geometry import Vec
+from tilecoord import TileCoord
+
+
+# Costs of moving straight and diagonally, scaled to whole numbers.
+_STRAIGHT_COST = 10
+_DIAGONAL_COST = 14
+
+# The (dx, dy) steps to the eight neighbours of a tile.
+_NEIGHBOURS = [(1, 0), (-1, 0), (0, 1), (0, -1),
+               (1, 1), (1, -1), (-1, 1), (-1, -1)]
+
+
+class NavGrid:
+    """A NavGrid records which tiles of a world can be walked through.
+
+    Tiles are stored in a flat bytearray, row by row, with a border of
+    unwalkable tiles around the world so that searches never need to
+    check whether a tile is in bounds. A tile's index in the bytearray
+    is its node number.
+
+    The grid also holds the cache of searches made on the world, since
+    those are only valid for as long as the grid is.
+    """
+
+    def __init__(self, world):
+        """Build the grid from the current tiles of a world."""
+        self.world = world
+        self.version = world.nav_version
+        self.width = world.get_width()
+        self.height = world.get_height()
+        self.stride = self.width + 2
+        self.walkable = bytearray(self.stride * (self.height + 2))
+        for block_y, row in enumerate(world.tiles):
+            for block_x, tile in enumerate(row):
+                if not tile.blocks_movement:
+                    self.walkable[self.to_node(block_x, block_y)] = 1
+        self.searches: Dict[Any, Any] = OrderedDict()
+        self.flow_fields: Dict[Any, Any] = OrderedDict()
+        # Node offsets and costs of the steps to each neighbour of a node,
+        # along with the offsets of the tiles that a diagonal step passes.
+        self.steps = [
+            (dx + dy * self.stride,
+             _DIAGONAL_COST if dx and dy else _STRAIGHT_COST,
+             dx if dx and dy else 0,
+             dy * self.stride if dx and dy else 0)
+            for dx, dy in _NEIGHBOURS]
+
+    def to_node(self, block_x, block_y):
+        """Get the node number of the tile at the given coordinates."""
+        return (block_y + 1) * self.stride + block_x + 1
+
+    def to_tile_coord(self, node):
+        """Get the TileCoord of a node number."""
+        block_y, block_x = divmod(node, self.stride)
+        return TileCoord(block_x - 1, block_y - 1)
+
+    def is_step_open(self, node, next_node):
+        """Check if an entity can step between two neighbouring nodes."""
+        if not self.walkable[next_node]:
+            return False
+        node_y, node_x = divmod(node, self.stride)
+        next_y, next_x = divmod(next_node, self.stride)
+        dx = next_x - node_x
+        dy = next_y - node_y
+        if not (dx and dy):
+            return True
+        return bool(self.walkable[node + dx]
+                    and self.walkable[node + dy * self.stride])
+
+    def update_tiles(self, tile_coords):
+        """Update the walkability of the given tiles from the world.
+
+        Returns:
+            The node numbers of the tiles whose walkability changed.
+        """
+        changed = []
+        for tile_coord in tile_coords:
+            if not (0 <= tile_coord.block_x < self.width
+                    and 0 <= tile_coord.block_y < self.height):
+                continue
+            node = self.to_node(*tile_coord)
+            walkable = int(not self.world.get_tile(tile_coord).blocks_movement)
+            if self.walkable[node] != walkable:
+                self.walkable[node] = walkable
+                changed.append(node)
+        return changed
+
+    def is_walkable(self, block_x, block_y):
+        """Check if the tile at the given coordinates can be walked through."""
+        return bool(0 <= block_x < self.width and 0 <= block_y < self.height
+                    and self.walkable[self.to_node(block_x, block_y)])
+
+    def is_stale(self):
+        """Check if the world's tiles have changed since the grid was built."""
+        return self.version != self.world.nav_version
+
+
+class PathSearch:
+    """A PathSearch is an A* search that can be run a bit at a time.
+
+    Once done is True, path is the list of TileCoords from start to goal
+    inclusive, or None if the goal cannot be reached.
+    """
+
+    def __init__(self, grid, start, goal):
+        """Start a search between two TileCoords on a NavGrid."""
+        self.grid = grid
+        self.start = start
+        self.goal = goal
+        self.version = grid.version
+        self.done = False
+        self.path = None
+        self.open = []
+        self.costs = {}
+        self.came_from = {}
+        if grid.is_walkable(*start) and grid.is_walkable(*goal):
+            start_node = grid.to_node(*start)
+            self.costs[start_node] = 0
+            self.open.append((self.estimate(start_node), 0, start_node))
+        else:
+            self.done = True
+
+    def estimate(self, node):
+        """Estimate the cost from a node to the goal if there were no walls."""
+        block_y, block_x = divmod(node, self.grid.stride)
+        dx = abs(block_x - 1 - self.goal.block_x)
+        dy = abs(block_y - 1 - self.goal.block_y)
+        return (_STRAIGHT_COST * (dx + dy)
+                + (_DIAGONAL_COST - 2 * _STRAIGHT_COST) * min(dx, dy))
+
+    def is_stale(self):
+        """Check if the world has changed since the search was started."""
+        return self.version != self.grid.world.nav_version
+
+    def step(self, max_nodes):
+        """Expand up to max_nodes nodes of the search.
+
+        Returns:
+            The number of nodes expanded.
+        """
+        walkable = self.grid.walkable
+        steps = self.grid.steps
+        stride = self.grid.stride
+        goal_x = self.goal.block_x + 1
+        goal_y = self.goal.block_y + 1
+        goal_node = self.grid.to_node(*self.goal)
+        costs = self.costs
+        came_from = self.came_from
+        open_heap = self.open
+        expanded = 0
+        while open_heap and expanded < max_nodes:
+            _, cost, node = heapq.heappop(open_heap)
+            if cost > costs[node]:
+                continue
+            expanded += 1
+            if node == goal_node:
+                self.finish()
+                return expanded
+            for offset, step_cost, side_x, side_y in steps:
+                next_node = node + offset
+                if not walkable[next_node]:
+                    continue
+                if side_x and not (walkable[node + side_x]
+                                   and walkable[node + side_y]):
+                    continue
+                next_cost = cost + step_cost
+                if next_cost < costs.get(next_node, next_cost + 1):
+                    costs[next_node] = next_cost
+                    came_from[next_node] = node
+                    block_y, block_x = divmod(next_node, stride)
+                    dx = abs(block_x - goal_x)
+                    dy = abs(block_y - goal_y)
+                    heapq.heappush(open_heap, (
+                        next_cost + _STRAIGHT_COST * (dx + dy)
+                        + (_DIAGONAL_COST - 2 * _STRAIGHT_COST) * min(dx, dy),
+                        next_cost,
+                        next_node))
+        if not open_heap:
+            self.finish()
+        return expanded
+
+    def finish(self):
+        """Mark the search as done, building the path if one was found."""
+        self.done = True
+        grid = self.grid
+        goal_node = grid.to_node(*self.goal)
+        start_node = grid.to_node(*self.start)
+        if goal_node in self.costs:
+            node = goal_node
+            path = [self.goal]
+            while node != start_node:
+                node = self.came_from[node]
+                path.append(grid.to_tile_coord(node))
+            path.reverse()
+            self.path = path
+        self.open = []
+        self.costs = {}
+        self.came_from = {}
+
+
+# The distance of tiles from which a FlowField's goal cannot be reached.
+_UNREACHABLE = float("inf")
+
+
+class FlowField:
+    """A FlowField holds the distance from every tile to one goal tile.
+
+    The distances are found with Dijkstra's algorithm spreading out from
+    the goal. Each tile also stores the neighbouring tile that is one
+    step closer to the goal, which is where an entity on it should go.
+    """
+
+    def __init__(self, grid, goal):
+        """Compute the distances to a goal TileCoord on a NavGrid."""
+        self.grid = grid
+        self.goal = goal
+        self.goal_node = grid.to_node(*goal)
+        self.dist = [_UNREACHABLE] * len(grid.walkable)
+        self.next_nodes = [-1] * len(grid.walkable)
+        if grid.is_walkable(*goal):
+            self.dist[self.goal_node] = 0
+            self.spread([(0, self.goal_node)])
+
+    def spread(self, heap):
+        """Lower distances outwards from the (distance, node) pairs in heap."""
+        walkable = self.grid.walkable
+        steps = self.grid.steps
+        dist = self.dist
+        next_nodes = self.next_nodes
+        heapq.heapify(heap)
+        while heap:
+            node_dist, node = heapq.heappop(heap)
+            if node_dist > dist[node]:
+                continue
+            for offset, step_cost, side_x, side_y in steps:
+                prev_node = node + offset
+                if not walkable[prev_node]:
+                    continue
+                if side_x and not (walkable[node + side_x]
+                                   and walkable[node + side_y]):
+                    continue
+                prev_dist = node_dist + step_cost
+                if prev_dist < dist[prev_node]:
+                    dist[prev_node] = prev_dist
+                    next_nodes[prev_node] = node
+                    heapq.heappush(heap, (prev_dist, prev_node))
+
+    def repair(self, changed):
+        """Fix the distances after the walkability of some nodes changed.
+
+        Tiles whose route to the goal went through a changed tile, or
+        cut the corner of one, are reset and filled in again from their
+        neighbours. Then the distances are lowered outwards from around
+        the changed tiles, in case they opened up shorter routes.
+        """
+        grid = self.grid
+        walkable = grid.walkable
+        steps = grid.steps
+        dist = self.dist
+        next_nodes = self.next_nodes
+        around_changed = set(changed)
+        for node in changed:
+            around_changed.update(node + step[0] for step in steps)
+        broken = [
+            node for node in around_changed
+            if dist[node] != _UNREACHABLE
+            and (not walkable[node]
+                 or (next_nodes[node] != -1
+                     and not grid.is_step_open(node, next_nodes[node])))]
+        reset = set()
+        while broken:
+            node = broken.pop()
+            if node in reset:
+                continue
+            reset.add(node)
+            broken.extend(
+                node + step[0] for step in steps
+                if next_nodes[node + step[0]] == node)
+        for node in reset:
+            dist[node] = _UNREACHABLE
+            next_nodes[node] = -1
+        heap = []
+        if walkable[self.goal_node] and dist[self.goal_node]:
+            dist[self.goal_node] = 0
+            next_nodes[self.goal_node] = -1
+            heap.append((0, self.goal_node))
+        for node in reset | around_changed:
+            if walkable[node] and dist[node] != _UNREACHABLE:
+                heap.append((dist[node], node))
+            elif walkable[node]:
+                for offset, _, _, _ in steps:
+                    near_node = node + offset
+                    if (dist[near_node] != _UNREACHABLE
+                            and near_node not in reset):
+                        heap.append((dist[near_node], near_node))
+        self.spread(heap)
+
+    def get_next_tile(self, tile_coord):
+        """Get the TileCoord to step to from a tile to get nearer the goal.
+
+        Returns None on the goal itself and on tiles it cannot be
+        reached from.
+        """
+        if not (0 <= tile_coord.block_x < self.grid.width
+                and 0 <= tile_coord.block_y < self.grid.height):
+            return None
+        next_node = self.next_nodes[self.grid.to_node(*tile_coord)]
+        if next_node == -1:
+            return None
+        return self.grid.to_tile_coord(next_node)
+
+    def get_distance(self, tile_coord):
+        """Get the distance from a tile to the goal in blocks, or None."""
+        if not (0 <= tile_coord.block_x < self.grid.width
+                and 0 <= tile_coord.block_y < self.grid.height):
+            return None
+        node_dist = self.dist[self.grid.to_node(*tile_coord)]
+        if node_dist == _UNREACHABLE:
+            return None
+        return node_dist / _STRAIGHT_COST
+
+
+class Pathfinder:
+    """The Pathfinder runs and caches the path searches of every world."""
+
+    def __init__(self):
+        """Start with no grids and no searches."""
+        self.grids: Dict[Any, NavGrid] = {}
+        self.pending = deque()
+
+    def get_grid(self, world):
+        """Get an up-to-date NavGrid for a world.
+
+        Instances that still share their template's tiles share its grid.
+        """
+        world = world.source
+        grid = self.grids.get(world)
+        if grid is None or grid.is_stale():
+            grid = NavGrid(world)
+            self.grids[world] = grid
+        return grid
+
+    def forget_world(self, world):
+        """Drop the NavGrid and searches of a world that is torn down."""
+        self.grids.pop(world, None)
+
+    def on_tiles_changed(self, world, tile_coords=None):
+        """Update a world's NavGrid after World.invalidate_navigation.
+
+        Args:
+            world: The World whose tiles changed. Its nav_version has
+                already been increased by one.
+            tile_coords: The TileCoords of the changed tiles, or None if
+                they are not known, in which case the grid is rebuilt.
+        """
+        grid = self.grids.get(world)
+        if grid is None:
+            return
+        if tile_coords is None or grid.version != world.nav_version - 1:
+            del self.grids[world]
+            return
+        grid.version = world.nav_version
+        grid.searches.clear()
+        changed = grid.update_tiles(tile_coords)
+        if changed:
+            for flow_field in grid.flow_fields.values():
+                flow_field.repair(changed)
+
+    def get_flow_field(self, world, goal):
+        """Get the FlowField towards a goal TileCoord in a world."""
+        grid = self.get_grid(world)
+        flow_field = grid.flow_fields.get(goal)
+        if flow_field is not None:
+            grid.flow_fields.move_to_end(goal)
+            return flow_field
+        flow_field = FlowField(grid, goal)
+        grid.flow_fields[goal] = flow_field
+        if len(grid.flow_fields) > Config.FLOW_FIELD_CACHE_SIZE:
+            grid.flow_fields.popitem(last=False)
+        return flow_field
+
+    def request(self, world, start, goal):
+        """Get the search for a path between two TileCoords in a world.
+
+        A cached search is returned if there is one. Otherwise a new
+        search is started, which is run by later calls to step.
+
+        Returns:
+            A PathSearch, which may not be done yet.
+        """
+        grid = self.get_grid(world)
+        key = (start, goal)
+        search = grid.searches.get(key)
+        if search is not None:
+            grid.searches.move_to_end(key)
+            return search
+        search = PathSearch(grid, start, goal)
+        grid.searches[key] = search
+        if len(grid.searches) > Config.PATH_CACHE_SIZE:
+            grid.searches.popitem(last=False)
+        if not search.done:
+            self.pending.append(search)
+        return search
+
+    def find_path(self, world, start, goal):
+        """Find a path between two TileCoords in a world straight away.
+
+        Returns:
+            The list of TileCoords from start to goal inclusive, or None
+            if the goal cannot be reached.
+        """
+        search = self.request(world, start, goal)
+        while not search.done:
+            search.step(Config.PATHFINDING_NODES_PER_TICK)
+        return search.path
+
+    def step(self, max_nodes=Config.PATHFINDING_NODES_PER_TICK):
+        """Run the pending searches, oldest first, for up to max_nodes nodes.
+
+        Searches on worlds that have changed since they started are
+        dropped; whoever made them should request a new search.
+        """
+        while self.pending and max_nodes > 0:
+            search = self.pending[0]
+            if not search.done and not search.is_stale():
+                max_nodes -= search.step(max_nodes)
+            if search.done or search.is_stale():
+                self.pending.popleft()
+
+
+def get_center_tile(pos, width):
+    """Get the TileCoord of the middle of an entity of the given width."""
+    return TileCoord.pos_to_tile_coord(
+        Vec(pos.x + width / 2, pos.y + width / 2))
+
+
+def path_to_waypoints(path, width):
+    """Convert a path to the positions an entity passes through.
+
+    Each position puts an entity of the given width in the middle of
+    a tile of the path.
+    """
+    offset = (Config.BLOCK_WIDTH - width) / 2
+    return [Vec(tile_coord.block_x * Config.BLOCK_WIDTH + offset,
+                tile_coord.block_y * Config.BLOCK_WIDTH + offset)
+            for tile_coord in path]
+
+
+pathfinder = Pathfinder()
@@ -1,10 +1,9 @@
 """Defines the Player class."""
-import math
-
 from battle import Combatant, Move, Species
 from config import Config
 from entitybasic import Entity
 from geometry import Direction, Vec
+from rng import make_rng
 from world import World
 
 
@@ -21,9 +20,13 @@ class Player(Entity, Combatant):
                            moves=[Move.PUNCH, Move.KICK])
         self.username = username
         self.world_id = world_id
+        self.instance_key = username
+        self.rng = make_rng(username)
         self.ws = ws
+        self.world_cache = None
+        self.roster = None
         self.online = True
-        self.talking_to = None
+        self.conversation = None
         self.time_of_last_move = 0
         self.portal_cooldown = 0
 
@@ -33,39 +36,59 @@ class Player(Entity, Combatant):
         self.portal_cooldown -= update_ctx.dt
         self.portal_cooldown = max(0, self.portal_cooldown)
 
+    def is_idle(self):
+        """Players only need updating during a portal cooldown."""
+        return not self.portal_cooldown and super().is_idle()
+
     def get_entities_can_interact(self, world):
-        """Get the entities the player can interact with.
+        """Get the entities the player can interact with, nearest first.
 
         Return all entities within 2 blocks Euclidean distance
         and within the viewing field between 45 degrees to the
         left of the player facing direction and 45 degrees to
-        the right.
+        the right. An offset is in that field when its component
+        along the facing direction is greater than the magnitude of
+        its component across it, so no angles are computed.
         """
-        if self.facing is Direction.LEFT:
-            return [
-                e for e in world.entities
-                if self.pos.dist_to(e.pos) < 2 * Config.BLOCK_WIDTH
-                and (
-                    (3*math.pi/4) < self.pos.angle_to(e.pos) < (math.pi)
-                    or (-math.pi) < self.pos.angle_to(e.pos) < (-3*math.pi/4))]
-        facing_angle = self.facing.direction_to_angle()
-        min_angle = facing_angle - math.pi/4
-        max_angle = facing_angle + math.pi/4
-        return [
-            e for e in world.entities
-            if self.pos.dist_to(e.pos) < 2 * Config.BLOCK_WIDTH
-            and min_angle < self.pos.angle_to(e.pos) < max_angle]
+        facing = Vec.vec_from_direction_str(self.facing.direction_to_str())
+        max_dist_sq = (2 * Config.BLOCK_WIDTH) ** 2
+        x, y = self.pos.x, self.pos.y
+        candidates = []
+        for e in world.entities:
+            dx = e.pos.x - x
+            dy = e.pos.y - y
+            dist_sq = dx*dx + dy*dy
+            if dist_sq >= max_dist_sq:
+                continue
+            along = dx*facing.x + dy*facing.y
+            across = dx*facing.y - dy*facing.x
+            if along > abs(across):
+                candidates.append((dist_sq, e))
+        candidates.sort(key=lambda candidate: candidate[0])
+        return [e for _, e in candidates]
 
     def get_bounding_box(self):
         """Get bounding box the size of a player."""
         return super().get_bounding_box_of_width(Config.PLAYER_WIDTH)
 
     def respawn(self):
-        """Reset player's location and other properties."""
+        """Reset player's location and other properties.
+
+        The player's conversation is forgotten, so it should be ended
+        with end_player_conversation first.
+        """
         world_id = "starting_world"
         spawn_id = "center_spawn"
         world = World.get_world_by_id(world_id)
         spawn_pos = world.spawn_points[spawn_id].to_spawn_pos()
+        active_set = self.active_set
+        world_cache = self.world_cache
+        roster = self.roster
+        rng = self.rng
         Player.__init__(
             self, self.username, spawn_pos, Vec(0, 0),
             Direction.DOWN, self.ws, world_id)
+        self.active_set = active_set
+        self.world_cache = world_cache
+        self.roster = roster
+        self.rng = rng
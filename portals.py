@@ -0,0 +1,76 @@
+"""Defines the portal graph, which links worlds through their portals.
+
+Each World indexes its portal tiles in portals, mapping their TileCoords
+to the PortalLinks they send players through. When the worlds are
+loaded, links to worlds or spawn points that do not exist are reported,
+and teleport ignores them. When a player comes within
+Config.PORTAL_PREFETCH_RADIUS blocks of a portal, the world it leads to
+is serialized ahead of time, without holding up the player's move: its
+client hash and the chunks around the spawn point are computed and
+pre-compressed, so that stepping into the portal only has to send them.
+Big worlds are hashed off the event loop, as when they are sent.
+"""
+from typing import Dict
+
+from offload import get_client_hash
+from tilecoord import TileCoord
+from util import Util
+from world import World
+
+
+# Maps PortalLinks to the client hash of the world when it was prefetched.
+_prefetched: Dict[tuple, str] = {}
+
+
+def is_link_valid(link):
+    """Check if a PortalLink leads to a spawn point that exists."""
+    try:
+        world = World.get_world_by_id(link.world_id)
+    except ValueError:
+        return False
+    return link.spawn_id in world.spawn_points
+
+
+def find_dangling_links():
+    """Find the portals that lead to worlds or spawn points that do not exist.
+
+    Returns:
+        A list of (world_id, TileCoord, PortalLink) tuples.
+    """
+    return [
+        (world.get_world_id(), tile_coord, link)
+        for world in World.get_worlds()
+        for tile_coord, link in world.portals.items()
+        if not is_link_valid(link)]
+
+
+def check_portal_links():
+    """Print a warning for each portal that leads nowhere."""
+    for world_id, tile_coord, link in find_dangling_links():
+        print(f"Warning: portal at {tile_coord.block_x},{tile_coord.block_y}"
+              f" in {world_id} leads to missing spawn point {link.spawn_id}"
+              f" in {link.world_id}")
+
+
+async def prefetch(link):
+    """Serialize the world a PortalLink leads to, around its spawn point.
+
+    Instanced worlds are prefetched through their template, whose
+    serialized chunks instances share.
+    """
+    world = World.get_world_by_id(link.world_id)
+    world_hash = await get_client_hash(world)
+    if _prefetched.get(link) == world_hash:
+        return
+    spawn_pos = world.spawn_points[link.spawn_id].to_spawn_pos()
+    chunks = world.get_chunks_by_distance(spawn_pos)
+    for chunk_x, chunk_y in chunks[:Util.get_near_chunk_count()]:
+        Util.get_chunk_message(world, chunk_x, chunk_y)
+    _prefetched[link] = world_hash
+
+
+async def prefetch_near(world, pos):
+    """Prefetch the worlds of the portals near a position in a world."""
+    for link in world.portal_zones.get(TileCoord.pos_to_tile_coord(pos), ()):
+        if is_link_valid(link):
+            await prefetch(link)
@@ -0,0 +1,104 @@
+"""Defines TrafficRecorder, which records the messages clients send.
+
+When Config.RECORD_PATH is set, every message sent to the server is
+written to that file along with the connection it came on and when it
+arrived, as are the times connections open and close, so that the
+traffic can be played back later with replay.py.
+
+The file starts with RECORDING_MAGIC. Each event after that is a header
+of RECORD_HEADER (microseconds since recording started, connection id,
+kind of event, and length of the message in bytes) followed by the
+message in UTF-8. Events are buffered in memory and written in blocks
+of Config.RECORD_BUFFER_SIZE bytes.
+"""
+from collections import namedtuple
+import struct
+import time
+
+from config import Config
+
+
+RECORDING_MAGIC = b"TERREKINREC1"
+
+RECORD_HEADER = struct.Struct("<QIBI")
+
+# The kinds of event in a recording.
+EVENT_OPEN = 0
+EVENT_MESSAGE = 1
+EVENT_CLOSE = 2
+
+RecordedEvent = namedtuple("RecordedEvent", [
+    "time",
+    "connection_id",
+    "kind",
+    "message"
+])
+
+
+class TrafficRecorder:
+    """Records the connections and messages of clients to a file."""
+
+    def __init__(self, path):
+        """Start recording to a new file at path."""
+        self.file = open(path, "wb", buffering=Config.RECORD_BUFFER_SIZE)
+        self.file.write(RECORDING_MAGIC)
+        self.start = time.monotonic()
+        self.next_connection_id = 0
+
+    def record(self, connection_id, kind, message=""):
+        """Record an event on a connection."""
+        data = message.encode("utf-8")
+        microseconds = int((time.monotonic() - self.start) * 1000000)
+        self.file.write(RECORD_HEADER.pack(
+            microseconds, connection_id, kind, len(data)))
+        self.file.write(data)
+
+    def open_connection(self):
+        """Record a new connection.
+
+        Returns:
+            The id of the connection in the recording.
+        """
+        connection_id = self.next_connection_id
+        self.next_connection_id += 1
+        self.record(connection_id, EVENT_OPEN)
+        return connection_id
+
+    def record_message(self, connection_id, message):
+        """Record a message sent on a connection."""
+        self.record(connection_id, EVENT_MESSAGE, message)
+
+    def close_connection(self, connection_id):
+        """Record that a connection closed."""
+        self.record(connection_id, EVENT_CLOSE)
+
+    def close(self):
+        """Write what is left of the recording and close the file."""
+        self.file.close()
+
+
+def read_recording(path):
+    """Read the events of a recording, in order.
+
+    An event cut short at the end of the file is left out.
+
+    Raises:
+        ValueError if the file is not a recording.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    if not data.startswith(RECORDING_MAGIC):
+        raise ValueError
+    events = []
+    offset = len(RECORDING_MAGIC)
+    while offset + RECORD_HEADER.size <= len(data):
+        microseconds, connection_id, kind, length = RECORD_HEADER.unpack_from(
+            data, offset)
+        offset += RECORD_HEADER.size
+        if offset + length > len(data):
+            break
+        message = data[offset:offset + length].decode("utf-8")
+        offset += length
+        events.append(RecordedEvent(
+            microseconds / 1000000, connection_id, kind, message))
+    return events
@@ -0,0 +1,128 @@
+"""Plays traffic recorded by TrafficRecorder back against a server.
+
+Run with `python replay.py RECORDING [--speed SPEED] [--uri URI]` while a
+server is running, e.g. a local one with Config.RANDOM_SEED set to the
+seed it had when the traffic was recorded. Each recorded connection is
+opened, sent its messages and closed at the times they were recorded,
+divided by SPEED, so that 2 replays twice as fast.
+
+If the server's random choices differ from the recording, battles get
+different UUIDs. Recorded battlemove messages are therefore sent with
+the UUIDs of the battle the connection is actually in.
+"""
+import argparse
+import asyncio
+import time
+import websockets
+from websockets.exceptions import ConnectionClosed
+
+from recording import EVENT_CLOSE, EVENT_MESSAGE, read_recording
+from serializer import loads
+
+
+class ReplayedConnection:
+    """One recorded connection being played back."""
+
+    def __init__(self, events):
+        """Initialize with the connection's events, in order."""
+        self.events = events
+        self.side = None
+        self.combatant_uuid = None
+        self.opponent_uuids = []
+        self.recorded_uuids = {}
+        self.lateness = 0
+
+    def on_server_message(self, message):
+        """Keep track of the battle the connection is in."""
+        verb, _, params = message.partition("|")
+        if verb == "battlestart":
+            self.side = params
+            self.recorded_uuids = {}
+        elif verb == "battlemovereq":
+            self.combatant_uuid = params
+        elif verb == "battlestatus":
+            self.opponent_uuids = [
+                combatant_uuid
+                for side, combatants in loads(params).items()
+                if side != self.side
+                for combatant_uuid in combatants]
+
+    def rewrite(self, message):
+        """Put the UUIDs of the live battle into a battlemove message."""
+        if not message.startswith("battlemove|"):
+            return message
+        params = message.split("|")
+        if len(params) != 4 or self.combatant_uuid is None:
+            return message
+        recorded_uuid, move_num, target_uuid = params[1:]
+        self.recorded_uuids[recorded_uuid] = self.combatant_uuid
+        if target_uuid not in self.recorded_uuids and self.opponent_uuids:
+            self.recorded_uuids[target_uuid] = self.opponent_uuids[0]
+        return "|".join([
+            "battlemove",
+            self.recorded_uuids[recorded_uuid],
+            move_num,
+            self.recorded_uuids.get(target_uuid, target_uuid)])
+
+    async def receive(self, ws):
+        """Read the server's messages until the connection closes."""
+        try:
+            async for message in ws:
+                if isinstance(message, str):
+                    self.on_server_message(message)
+        except ConnectionClosed:
+            pass
+
+    async def play(self, uri, start, speed):
+        """Open the connection and send its messages on time."""
+        await asyncio.sleep(max(0, start + self.events[0].time / speed
+                                - time.monotonic()))
+        async with websockets.connect(uri) as ws:
+            receiver = asyncio.ensure_future(self.receive(ws))
+            try:
+                for event in self.events[1:]:
+                    due = start + event.time / speed
+                    await asyncio.sleep(max(0, due - time.monotonic()))
+                    self.lateness = max(self.lateness,
+                                        time.monotonic() - due)
+                    if event.kind == EVENT_MESSAGE:
+                        await ws.send(self.rewrite(event.message))
+                    elif event.kind == EVENT_CLOSE:
+                        break
+            except ConnectionClosed:
+                pass
+            finally:
+                receiver.cancel()
+
+
+async def replay(path, uri, speed):
+    """Play a recording back against the server at uri."""
+    connections = {}
+    for event in read_recording(path):
+        connections.setdefault(event.connection_id, []).append(event)
+    replayed = [ReplayedConnection(events)
+                for events in connections.values()]
+    messages = sum(
+        1 for events in connections.values()
+        for event in events if event.kind == EVENT_MESSAGE)
+    start = time.monotonic()
+    await asyncio.gather(*(
+        connection.play(uri, start, speed) for connection in replayed))
+    elapsed = time.monotonic() - start
+    lateness = max((connection.lateness for connection in replayed),
+                   default=0)
+    print(f"Replayed {len(replayed)} connections and {messages} messages "
+          f"in {elapsed:.2f} s, at most {lateness * 1000:.1f} ms late")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Play recorded client traffic back against a server.")
+    parser.add_argument("recording", help="file recorded by the server")
+    parser.add_argument("--speed", type=float, default=1,
+                        help="how many times faster than recorded to play")
+    parser.add_argument("--uri", default="ws://localhost:8080",
+                        help="WebSocket URI of the server")
+    args = parser.parse_args()
+    asyncio.get_event_loop().run_until_complete(
+        replay(args.recording, args.uri, args.speed))
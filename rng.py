@@ -0,0 +1,18 @@
+"""Defines make_rng, which gives each player random numbers of their own.
+
+A player's wild encounters and battles draw from the player's own
+random.Random. When Config.RANDOM_SEED is set, it is seeded with the
+seed and the player's username, so that traffic replayed with replay.py
+makes the same random choices for each player, whatever order the
+players' messages are handled in.
+"""
+import random
+
+from config import Config
+
+
+def make_rng(username):
+    """Make the random number generator of the player with a username."""
+    if Config.RANDOM_SEED is None:
+        return random.Random()
+    return random.Random(f"{Config.RANDOM_SEED}:{username}")
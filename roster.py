@@ -0,0 +1,65 @@
+"""Defines the WorldRoster class, which indexes the players in a world."""
+from typing import Any, Dict
+
+from config import Config
+
+
+class WorldRoster:
+    """A WorldRoster keeps track of the players in one world and where.
+
+    Players are bucketed into cells one block wide by the position of the
+    upper-left corner of their bounding box, so players near a point can
+    be found without looking at every player in the world. The roster
+    does not notice players moving by itself; Game.locate_player must be
+    called after a player's position or world changes.
+    """
+
+    def __init__(self, world_id):
+        """Initialize an empty roster for the world with the given id."""
+        self.world_id = world_id
+        self.players: Dict[Any, Any] = {}
+        self.cells: Dict[Any, Any] = {}
+
+    @staticmethod
+    def get_cell(x, y):
+        """Get the cell that a point is in."""
+        return int(x // Config.BLOCK_WIDTH), int(y // Config.BLOCK_WIDTH)
+
+    def update(self, player):
+        """Add a player to the roster, or move it to its current cell."""
+        cell = WorldRoster.get_cell(player.pos.x, player.pos.y)
+        old_cell = self.players.get(player)
+        if old_cell == cell:
+            return
+        if old_cell is not None:
+            self.remove(player)
+        self.players[player] = cell
+        self.cells.setdefault(cell, {})[player] = None
+        player.roster = self
+
+    def remove(self, player):
+        """Remove a player from the roster."""
+        cell = self.players.pop(player)
+        cell_players = self.cells[cell]
+        del cell_players[player]
+        if not cell_players:
+            del self.cells[cell]
+        player.roster = None
+
+    def get_players(self):
+        """Get all the players in the world."""
+        return list(self.players)
+
+    def get_players_near(self, left, top, right, bottom):
+        """Get the players whose upper-left corner may be in a region.
+
+        Every player whose upper-left corner is in the region is returned,
+        along with some players in the same cells who are just outside it.
+        """
+        start_x, start_y = WorldRoster.get_cell(left, top)
+        end_x, end_y = WorldRoster.get_cell(right, bottom)
+        players = []
+        for cell_y in range(start_y, end_y + 1):
+            for cell_x in range(start_x, end_x + 1):
+                players.extend(self.cells.get((cell_x, cell_y), ()))
+        return players
@@ -0,0 +1,203 @@
+"""Defines MessageRouter, which hands client messages to their handlers.
+
+A message's verb is the part before its first "|". Each verb has one
+MessageHandler, registered with register_handler and found with a
+single dict lookup, so routing a message costs the same however many
+kinds of message there are. The handler parses the message's parameters
+once into a command, which it is then given to carry out along with the
+Connection the message came from.
+"""
+from collections import namedtuple
+import asyncio
+import time
+from typing import Any, Dict
+
+from config import Config
+from entitybasic import EntityEventContext
+from tilebasic import TileEventContext
+from world import World
+
+
+_handlers: Dict[str, Any] = {}  # Maps verbs to MessageHandler objects.
+
+
+HandlerReport = namedtuple("HandlerReport", [
+    "verb",
+    "messages",
+    "total_time",
+    "max_time"
+])
+
+
+class MessageHandler:
+    """A MessageHandler carries out one kind of message from a client.
+
+    Messages from players in a battle are ignored unless
+    allowed_in_battle is set.
+    """
+
+    allowed_in_battle = False
+
+    def parse(self, verb, params):
+        """Parse the parameters of a message into a command.
+
+        Args:
+            verb: The verb the message was sent with.
+            params: The list of parameters after the verb.
+
+        Raises:
+            ValueError or IndexError if the parameters are malformed,
+            in which case the message is ignored.
+        """
+        del verb, params  # Unused
+
+    async def handle(self, connection, command):
+        """Carry out a command parsed from a message on a Connection."""
+
+
+def register_handler(*verbs):
+    """Class decorator to register the verbs with a MessageHandler class.
+
+    One instance of the class handles every message with those verbs.
+    """
+    def decorator(handler_class):
+        handler = handler_class()
+        for verb in verbs:
+            if verb in _handlers:
+                raise ValueError
+            _handlers[verb] = handler
+        return handler_class
+    return decorator
+
+
+def get_handler(verb):
+    """Get the MessageHandler of a verb."""
+    handler = _handlers.get(verb)
+    if not handler:
+        raise ValueError
+    return handler
+
+
+class Connection:
+    """The state of one client's connection, shared by its messages.
+
+    The player is resolved once, when the client logs in, and the world
+    the player is in is looked up again only when the player changes
+    worlds.
+    """
+
+    def __init__(self, game, ws, player):
+        """Initialize with the game and the player connected."""
+        self.game = game
+        self.ws = ws
+        self.player = player
+        self.username = player.username
+        self._world_id = None
+        self._world = None
+
+    def get_world(self):
+        """Get the World that the player is in."""
+        if self._world_id != self.player.world_id:
+            self._world = World.get_world_by_id(self.player.world_id)
+            self._world_id = self.player.world_id
+        return self._world
+
+    def get_battle(self):
+        """Get the battle that the player is in, or None."""
+        return self.game.get_battle_by_username(self.username)
+
+    def get_entity_event_context(self):
+        """Get an EntityEventContext for the player."""
+        return EntityEventContext(
+            game=self.game,
+            ws=self.ws,
+            username=self.username,
+            world=self.get_world(),
+            player=self.player)
+
+    def get_tile_event_context(self, tile_pos):
+        """Get a TileEventContext for the player and the given tile."""
+        return TileEventContext(
+            game=self.game,
+            ws=self.ws,
+            username=self.username,
+            world=self.get_world(),
+            player=self.player,
+            tile_pos=tile_pos)
+
+
+class MessageRouter:
+    """Routes messages to their handlers and times how long they take.
+
+    Each function in timing_hooks is called with the verb and the time
+    taken, in seconds, after every message handled. The router's own
+    hook keeps the statistics for its reports.
+    """
+
+    def __init__(self):
+        """Start with only the router's own timing hook."""
+        self.timing_hooks = [self.record_timing]
+        self.timings = {}
+
+    def add_timing_hook(self, hook):
+        """Call hook(verb, duration) after every message handled."""
+        self.timing_hooks.append(hook)
+
+    async def route(self, connection, verb, params):
+        """Handle a message from a connection.
+
+        Messages with an unknown verb or malformed parameters are ignored.
+
+        Args:
+            connection: The Connection the message came from.
+            verb: The part of the message before the first "|".
+            params: The rest of the message, after the first "|".
+        """
+        handler = _handlers.get(verb)
+        if handler is None:
+            return
+        try:
+            command = handler.parse(verb, params.split("|"))
+        except (ValueError, IndexError):
+            return
+        if not handler.allowed_in_battle and connection.get_battle():
+            return
+        start = time.perf_counter()
+        try:
+            await handler.handle(connection, command)
+        finally:
+            duration = time.perf_counter() - start
+            for hook in self.timing_hooks:
+                hook(verb, duration)
+
+    def record_timing(self, verb, duration):
+        """Add the time taken by a message to the statistics."""
+        timing = self.timings.get(verb)
+        if timing is None:
+            self.timings[verb] = [1, duration, duration]
+        else:
+            timing[0] += 1
+            timing[1] += duration
+            timing[2] = max(timing[2], duration)
+
+    def get_reports(self):
+        """Get the statistics of each verb since the last reports.
+
+        The statistics are reset afterwards.
+        """
+        reports = [
+            HandlerReport(verb=verb, messages=messages,
+                          total_time=total_time, max_time=max_time)
+            for verb, (messages, total_time, max_time)
+            in sorted(self.timings.items())]
+        self.timings = {}
+        return reports
+
+    async def run_reports(self):
+        """Print reports every Config.TICK_REPORT_DT seconds forever."""
+        while True:
+            await asyncio.sleep(Config.TICK_REPORT_DT)
+            for report in self.get_reports():
+                print(f"{report.verb}: {report.messages} messages, "
+                      f"mean {report.total_time / report.messages * 1000:.2f}"
+                      f" ms, max {report.max_time * 1000:.2f} ms")
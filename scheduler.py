@@ -0,0 +1,115 @@
+"""Defines the UpdateScheduler class, which decides what to update."""
+from collections import namedtuple
+import time
+
+from config import Config
+from entitybasic import EntityUpdateContext
+from pathfinding import pathfinder
+from world import World
+
+
+TickReport = namedtuple("TickReport", [
+    "ticks",
+    "entities_updated",
+    "entities_total",
+    "budget_used"
+])
+
+
+class UpdateScheduler:
+    """The UpdateScheduler updates the awake entities every tick.
+
+    Only worlds with players in them are updated, and within those only
+    the entities in the world's active_entities. An entity leaves that
+    set once its is_idle method returns True, and rejoins it when
+    something calls its wake method. Players are kept in the Game's
+    active_players in the same way.
+    """
+
+    def __init__(self, game):
+        """Initialize with the Game whose entities are updated."""
+        self.game = game
+        self.ticks = 0
+        self.entities_updated = 0
+        self.entities_total = 0
+        self.time_spent = 0
+        self.last_report = time.monotonic()
+        self.inhabited_world_ids = set()
+
+    def tick(self, dt):
+        """Run path searches, cutscenes, then every awake entity.
+
+        Only worlds with players in them are updated. A world's
+        cutscenes start playing when a player enters it while empty.
+        """
+        start = time.perf_counter()
+        pathfinder.step()
+        inhabited_world_ids = self.game.get_inhabited_world_ids()
+        for world_id in inhabited_world_ids:
+            world = World.get_world_by_id(world_id)
+            if world_id not in self.inhabited_world_ids:
+                world.start_cutscenes()
+            world.advance_cutscenes(dt)
+            self.entities_total += len(world.entities)
+            update_ctx = EntityUpdateContext(
+                game=self.game,
+                world=world,
+                dt=dt)
+            self.update_active(world.active_entities, update_ctx)
+        self.entities_total += len(self.game.players)
+        for player in list(self.game.active_players):
+            player.update(EntityUpdateContext(
+                game=self.game,
+                world=World.get_world_by_id(player.world_id),
+                dt=dt))
+            self.entities_updated += 1
+            if player.is_idle():
+                del self.game.active_players[player]
+        self.inhabited_world_ids = set(inhabited_world_ids)
+        self.ticks += 1
+        self.time_spent += time.perf_counter() - start
+
+    def update_active(self, active_entities, update_ctx):
+        """Update the given awake entities and put idle ones to sleep.
+
+        The world's cached entities message is dropped, since the
+        entities may have moved.
+        """
+        update_ctx.world.client_entities = None
+        for ent in list(active_entities):
+            ent.update(update_ctx)
+            self.entities_updated += 1
+            if ent.is_idle():
+                del active_entities[ent]
+
+    def get_report(self):
+        """Get the tick statistics since the last report and reset them.
+
+        Returns:
+            A TickReport whose entities_updated and entities_total are
+            averages per tick, and whose budget_used is the fraction of
+            Config.UPDATE_DT spent updating.
+        """
+        ticks = max(self.ticks, 1)
+        report = TickReport(
+            ticks=self.ticks,
+            entities_updated=self.entities_updated / ticks,
+            entities_total=self.entities_total / ticks,
+            budget_used=self.time_spent / ticks / Config.UPDATE_DT)
+        self.ticks = 0
+        self.entities_updated = 0
+        self.entities_total = 0
+        self.time_spent = 0
+        return report
+
+    def maybe_print_report(self):
+        """Print a report every Config.TICK_REPORT_DT seconds."""
+        now = time.monotonic()
+        if now - self.last_report < Config.TICK_REPORT_DT:
+            return
+        self.last_report = now
+        report = self.get_report()
+        print(f"Updated {report.entities_updated:.1f} of "
+              f"{report.entities_total:.1f} entities per tick over "
+              f"{report.ticks} ticks, using "
+              f"{report.budget_used:.1%} of the tick budget")
@@ -0,0 +1,99 @@
+"""Defines dumps and loads, which convert between objects and JSON strings.
+
+The JSON backend is chosen by Config.JSON_BACKEND. With "auto", the
+fastest installed backend is used: orjson, then msgspec, then the json
+module from the standard library. Every backend produces compact JSON
+with no whitespace, with non-ASCII characters unescaped and with
+non-string dict keys like ints written as strings, and every backend
+reads what the others write. The output is not byte for byte the same,
+though: floats written with an exponent, like 1e-05 and 1e+20 from the
+json module, are 0.00001 and 1e20 from orjson and msgspec. Anything
+hashed from encoded JSON, like world client hashes, is therefore only
+stable while the backend stays the same.
+"""
+from collections import namedtuple
+import json
+
+from config import Config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+JsonBackend = namedtuple("JsonBackend", [
+    "name",
+    "dumps",
+    "loads"
+])
+
+
+def _default(obj):
+    """Convert objects that fast backends do not handle, like namedtuples."""
+    if isinstance(obj, tuple):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+_backends = {
+    "json": JsonBackend(
+        name="json",
+        dumps=lambda obj: json.dumps(obj, ensure_ascii=False,
+                                     separators=(",", ":")),
+        loads=json.loads)
+}
+
+if msgspec is not None:
+    _msgspec_encoder = msgspec.json.Encoder(enc_hook=_default)
+    _backends["msgspec"] = JsonBackend(
+        name="msgspec",
+        dumps=lambda obj: _msgspec_encoder.encode(obj).decode("utf-8"),
+        loads=msgspec.json.Decoder().decode)
+
+if orjson is not None:
+    _backends["orjson"] = JsonBackend(
+        name="orjson",
+        dumps=lambda obj: orjson.dumps(
+            obj, default=_default,
+            option=orjson.OPT_NON_STR_KEYS).decode("utf-8"),
+        loads=orjson.loads)
+
+
+def get_backend(name):
+    """Get an installed JsonBackend by name, or the fastest if name is "auto".
+
+    Raises:
+        ValueError: If the backend is unknown or not installed.
+    """
+    if name == "auto":
+        for backend_name in ("orjson", "msgspec", "json"):
+            if backend_name in _backends:
+                return _backends[backend_name]
+    try:
+        return _backends[name]
+    except KeyError:
+        raise ValueError(f"JSON backend {name} is not installed")
+
+
+def get_backends():
+    """Get every installed JsonBackend."""
+    return list(_backends.values())
+
+
+backend = get_backend(Config.JSON_BACKEND)
+
+
+def dumps(obj):
+    """Convert an object to a compact JSON string."""
+    return backend.dumps(obj)
+
+
+def loads(string):
+    """Convert a JSON string or bytes to an object."""
+    return backend.loads(string)
@@ -0,0 +1,187 @@
+"""Defines Session and SessionStore, which let clients resume connections.
+
+Messages to a player are sent through the player's Session rather than
+straight to its WebSocket. The session numbers the messages and keeps
+the last Config.SESSION_BUFFER_SIZE of them, so a client that loses its
+connection can reconnect within Config.RESUME_WINDOW seconds, say how
+many messages it received, and be sent only the ones it missed instead
+of the whole world again.
+"""
+from collections import OrderedDict, deque
+import asyncio
+import hmac
+import secrets
+import time
+from websockets.exceptions import ConnectionClosed
+
+from config import Config
+
+
+class Session:
+    """A player's stream of messages, which can outlive a connection."""
+
+    def __init__(self, username):
+        """Start with a new token and no connection."""
+        self.username = username
+        self.token = secrets.token_hex(16)
+        self.ws = None
+        self.sent_count = 0
+        self.buffer = deque(maxlen=Config.SESSION_BUFFER_SIZE)
+        self.detach_time = None
+        self.lock = asyncio.Lock()
+        self.attached = asyncio.Event()
+        self.expired = False
+
+    async def send(self, message):
+        """Send a message, keeping it in case the session is resumed.
+
+        While the session has no open connection the message is only
+        kept, so this never raises ConnectionClosed.
+
+        Returns:
+            True if the message was written to an open connection, False
+            if it was only kept.
+        """
+        async with self.lock:
+            self.sent_count += 1
+            self.buffer.append(message)
+            if self.ws is None or not self.attached.is_set():
+                return False
+            try:
+                await self.ws.send(message)
+            except ConnectionClosed:
+                self.attached.clear()
+                return False
+            return True
+
+    async def wait_attached(self):
+        """Wait until the session has an open connection again.
+
+        Returns:
+            True once a connection is attached, or False if the session
+            expired first.
+        """
+        await self.attached.wait()
+        return not self.expired
+
+    def expire(self):
+        """Mark the session as no longer resumable, waking any waiters."""
+        self.expired = True
+        self.attached.set()
+
+    async def start(self, ws):
+        """Attach a connection that starts from nothing.
+
+        The client is sent the session's token, and messages are counted
+        from zero again.
+        """
+        async with self.lock:
+            self.sent_count = 0
+            self.buffer.clear()
+            self.ws = ws
+            self.detach_time = None
+            await ws.send(f"session|{self.token}")
+            self.attached.set()
+
+    def get_missed(self, received_count):
+        """Get the messages sent after the first received_count.
+
+        Returns:
+            A list of messages, or None if they are not all still kept.
+        """
+        missed_count = self.sent_count - received_count
+        if missed_count < 0 or missed_count > len(self.buffer):
+            return None
+        return list(self.buffer)[len(self.buffer) - missed_count:]
+
+    async def resume(self, ws, missed):
+        """Attach a connection that picks up where the last one left off.
+
+        The client is told that the session was resumed and sent the
+        messages it missed. If another connection is still attached, it
+        is closed.
+        """
+        async with self.lock:
+            old_ws = self.ws
+            self.ws = ws
+            self.detach_time = None
+            await ws.send("resumed")
+            for message in missed:
+                await ws.send(message)
+            self.attached.set()
+        if old_ws is not None and old_ws is not ws:
+            await old_ws.close(1000, "Session resumed elsewhere")
+
+    def detach(self, ws):
+        """Detach a connection that has closed.
+
+        Returns:
+            True if ws was the session's connection, False if another
+            connection had already taken over.
+        """
+        if self.ws is not ws:
+            return False
+        self.ws = None
+        self.attached.clear()
+        self.detach_time = time.monotonic()
+        return True
+
+
+class SessionStore:
+    """Keeps the session of each user until it can no longer be resumed."""
+
+    def __init__(self):
+        """Start with no sessions."""
+        self.sessions = {}
+        self.detached = OrderedDict()
+
+    def create(self, username):
+        """Make a new session for a user, replacing any old one."""
+        self.expire()
+        old_session = self.sessions.get(username)
+        if old_session is not None:
+            self.detached.pop(old_session, None)
+            old_session.expire()
+        session = Session(username)
+        self.sessions[username] = session
+        return session
+
+    def resume(self, username, token, received_count):
+        """Find the session a client wants to resume.
+
+        Returns:
+            The session and the list of messages the client missed, or
+            (None, None) if the session cannot be resumed.
+        """
+        self.expire()
+        session = self.sessions.get(username)
+        if session is None or not hmac.compare_digest(session.token, token):
+            return None, None
+        missed = session.get_missed(received_count)
+        if missed is None:
+            return None, None
+        self.detached.pop(session, None)
+        return session, missed
+
+    def detach(self, session, ws):
+        """Detach a connection that has closed from its session.
+
+        Returns:
+            True if ws was the session's connection.
+        """
+        if not session.detach(ws):
+            return False
+        self.detached[session] = None
+        return True
+
+    def expire(self):
+        """Forget the sessions detached for longer than the resume window."""
+        now = time.monotonic()
+        while self.detached:
+            session = next(iter(self.detached))
+            if now - session.detach_time < Config.RESUME_WINDOW:
+                break
+            del self.detached[session]
+            session.expire()
+            if self.sessions.get(session.username) is session:
+                del self.sessions[session.username]
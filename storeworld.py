@@ -1,14 +1,82 @@
 """Defines functions to save worlds to file."""
-import json
+import hashlib
 
+from serializer import dumps
 
-def world_to_client_json(world, spawn_pos):
-    """Convert a world to a JSON string to be sent to the client."""
-    return json.dumps(world.to_json_client(spawn_pos),
-                      separators=(",", ":"))
+
+def world_to_client_json(world, spawn_pos, is_cached=False):
+    """Convert a world to a JSON string to be sent to the client.
+
+    Args:
+        world: The World to convert.
+        spawn_pos: The position the player spawns at.
+        is_cached: True if the client already has the world's static data,
+            so that only the dynamic data needs to be sent.
+    """
+    return dumps(world.to_json_client(spawn_pos,
+                                      world_client_hash(world),
+                                      is_cached))
+
+
+def world_client_hash(world):
+    """Get a hash of the static data of a world that is sent to the client.
+
+    The static data is everything but the entities and spawn position,
+    including every chunk. The hash is cached on the world until
+    World.invalidate_client_cache is called.
+    """
+    if world.client_hash is None:
+        world.client_hash = compute_client_hash(world, world.client_chunks)
+    return world.client_hash
+
+
+def compute_client_hash(world, chunk_strs):
+    """Compute the hash of the static client data of a world.
+
+    Chunks missing from chunk_strs, a dict like World.client_chunks, are
+    encoded and added to it. The world itself is only read, so this can
+    run outside the event loop on a copy of the world's client_chunks.
+    The hash is of the encoded JSON the client is sent, so it changes if
+    Config.JSON_BACKEND does (see serializer.py).
+    """
+    world_hash = hashlib.blake2b(digest_size=16)
+    world_hash.update(dumps(world.to_json_client_static()).encode())
+    for chunk_x, chunk_y in world.get_chunks():
+        world_hash.update(encode_chunk(
+            world, chunk_strs, chunk_x, chunk_y).encode())
+    return world_hash.hexdigest()
+
+
+def chunk_to_client_json(world, chunk_x, chunk_y):
+    """Convert a chunk of a world to a JSON string to be sent to the client.
+
+    The string is cached on the world, so each chunk is encoded once.
+    """
+    return encode_chunk(world, world.client_chunks, chunk_x, chunk_y)
+
+
+def encode_chunk(world, chunk_strs, chunk_x, chunk_y):
+    """Get a chunk's JSON string from chunk_strs, encoding it if missing."""
+    chunk_str = chunk_strs.get((chunk_x, chunk_y))
+    if chunk_str is None:
+        chunk_str = dumps(world.to_json_client_chunk(chunk_x, chunk_y))
+        chunk_strs[(chunk_x, chunk_y)] = chunk_str
+    return chunk_str
+
+
+def entities_to_client_message(world):
+    """Get the entities message of a world.
+
+    The message is cached on the world until the next update, so players
+    in the same world asking for updates share one encoding.
+    """
+    if world.client_entities is None:
+        world.client_entities = "entities|" + "|".join(
+            dumps(entity_obj)
+            for entity_obj in world.to_json_client_entities())
+    return world.client_entities
 
 
 def world_to_save_json(world):
     """Convert a world to a JSON string to be saved to file."""
-    return json.dumps(world.to_json_save(),
-                      separators=(",", ":"))
+    return dumps(world.to_json_save())
@@ -6,12 +6,26 @@ from world import World
 
 
 async def teleport(game, ws, username, player, world_id, spawn_id):
-    """Change player's world and send new world to client."""
+    """Change player's world and send new world to client.
+
+    Players going to an instanced world are sent to their own instance.
+    Portals to worlds or spawn points that do not exist do nothing. The
+    spawn point is looked up on the template, before any instance of it
+    is made.
+    """
     if not player.portal_cooldown:
+        try:
+            template = World.get_world_by_id(world_id)
+            spawn_pos = template.spawn_points[spawn_id].to_spawn_pos()
+        except (ValueError, KeyError):
+            return
+        world_id = World.get_instance_id(world_id, player.instance_key)
         world = World.get_world_by_id(world_id)
         player.world_id = world_id
-        player.pos = world.spawn_points[spawn_id].to_spawn_pos()
+        player.pos = spawn_pos
         player.portal_cooldown = Config.PORTAL_COOLDOWN_DT
-        await Util.send_world(ws, world, player.pos)
+        player.wake()
+        game.locate_player(player)
+        await Util.send_world(ws, world, player.pos, player.world_cache)
         await Util.send_players(
             game, ws, username, world_id)
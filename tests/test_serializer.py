@@ -0,0 +1,40 @@
+"""Tests that every installed JSON backend agrees with the others."""
+import unittest
+
+from serializer import get_backend, get_backends
+
+
+class SerializerTest(unittest.TestCase):
+    """Round-trips values through every pair of installed backends."""
+
+    def test_floats_round_trip(self):
+        """Floats read back exactly, whichever backends write and read."""
+        floats = [0.1, 1.5, -0.0, 3.0, 1e-05, 1e-7, 1e16, 1e+20,
+                  2.5e-300, 1e300, 123456789.125]
+        for writer in get_backends():
+            for reader in get_backends():
+                with self.subTest(writer=writer.name, reader=reader.name):
+                    self.assertEqual(reader.loads(writer.dumps(floats)),
+                                     floats)
+
+    def test_int_keys_round_trip(self):
+        """Int dict keys are written as strings by every backend."""
+        obj = {1: "a", 2: [1.0, {3: None}]}
+        expected = {"1": "a", "2": [1.0, {"3": None}]}
+        for writer in get_backends():
+            for reader in get_backends():
+                with self.subTest(writer=writer.name, reader=reader.name):
+                    self.assertEqual(reader.loads(writer.dumps(obj)),
+                                     expected)
+
+    def test_same_output_without_exponents(self):
+        """Backends write the same text unless a float needs an exponent."""
+        obj = {"name": "Zoë", 7: (1, 2.5, True, None), "list": [0.1, -3]}
+        expected = get_backend("json").dumps(obj)
+        for backend in get_backends():
+            with self.subTest(backend=backend.name):
+                self.assertEqual(backend.dumps(obj), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
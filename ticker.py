@@ -0,0 +1,113 @@
+"""Defines the Ticker class, which runs a function at a fixed rate."""
+from collections import namedtuple
+from enum import Enum, unique
+import asyncio
+
+from config import Config
+
+
+@unique
+class CatchUp(Enum):
+    """What a Ticker does when it falls behind its deadlines.
+
+    SKIP runs one late tick with the real elapsed time as dt and drops
+    the missed ticks. SUBSTEP runs one tick of the fixed period for
+    each missed tick, up to Config.MAX_SUBSTEPS, and drops the rest.
+    """
+
+    SKIP = "skip"
+    SUBSTEP = "substep"
+
+
+TickerReport = namedtuple("TickerReport", [
+    "name",
+    "ticks",
+    "mean_duration",
+    "max_duration",
+    "overruns",
+    "dropped"
+])
+
+
+class Ticker:
+    """A Ticker calls a function every period seconds.
+
+    Ticks are scheduled against absolute deadlines from the event loop's
+    clock, so the time spent in the function does not add to the period.
+    The function is given the dt to simulate, and may be a coroutine
+    function.
+    """
+
+    def __init__(self, name, period, func, catch_up=CatchUp.SKIP):
+        """Initialize with a name for reports, the period, and the function."""
+        self.name = name
+        self.period = period
+        self.func = func
+        self.catch_up = catch_up
+        self.ticks = 0
+        self.total_duration = 0
+        self.max_duration = 0
+        self.overruns = 0
+        self.dropped = 0
+
+    async def call(self, dt):
+        """Call the function with the given dt."""
+        result = self.func(dt)
+        if asyncio.iscoroutine(result):
+            await result
+
+    async def run(self):
+        """Call the function every period seconds forever."""
+        loop = asyncio.get_event_loop()
+        then = loop.time()
+        deadline = then + self.period
+        while True:
+            await asyncio.sleep(max(0, deadline - loop.time()))
+            now = loop.time()
+            missed = int((now - deadline) // self.period)
+            if self.catch_up is CatchUp.SUBSTEP:
+                steps = min(missed + 1, Config.MAX_SUBSTEPS)
+                for _ in range(steps):
+                    await self.call(self.period)
+                self.dropped += missed + 1 - steps
+            else:
+                await self.call(now - then)
+                self.dropped += missed
+            then = now
+            deadline += self.period * (missed + 1)
+            self.record(loop.time() - now)
+
+    def record(self, duration):
+        """Record how long a tick took."""
+        self.ticks += 1
+        self.total_duration += duration
+        self.max_duration = max(self.max_duration, duration)
+        if duration > self.period:
+            self.overruns += 1
+
+    def get_report(self):
+        """Get the timing statistics since the last report and reset them."""
+        report = TickerReport(
+            name=self.name,
+            ticks=self.ticks,
+            mean_duration=self.total_duration / max(self.ticks, 1),
+            max_duration=self.max_duration,
+            overruns=self.overruns,
+            dropped=self.dropped)
+        self.ticks = 0
+        self.total_duration = 0
+        self.max_duration = 0
+        self.overruns = 0
+        self.dropped = 0
+        return report
+
+    async def run_reports(self):
+        """Print a report every Config.TICK_REPORT_DT seconds forever."""
+        while True:
+            await asyncio.sleep(Config.TICK_REPORT_DT)
+            report = self.get_report()
+            print(f"{report.name}: {report.ticks} ticks, "
+                  f"mean {report.mean_duration * 1000:.2f} ms, "
+                  f"max {report.max_duration * 1000:.2f} ms, "
+                  f"{report.overruns} overruns, "
+                  f"{report.dropped} dropped")
@@ -1,11 +1,9 @@
 """Defines classes for various tiles."""
-import random
-
 from battle import RandomMoveAICombatant
 from geometry import Direction
 from teleport import teleport
 from tilebasic import (
-    Tile, TilePlus, TileMetadata,
+    PortalLink, Tile, TilePlus, TileMetadata,
     register_tile, register_tile_plus)
 from util import Util
 
@@ -61,7 +59,8 @@ class WildGrass(TilePlus):
         patch = event_ctx.world.patches.get(self.data.patch_id)
         if not patch:
             return
-        random_num = random.random()
+        rng = event_ctx.player.rng
+        random_num = rng.random()
         weight_total = sum(encounter.weight for encounter in patch)
         start = 0
         generated_encounter = None
@@ -79,8 +78,8 @@ class WildGrass(TilePlus):
                     event_ctx.player,
                     RandomMoveAICombatant(
                         species=generated_encounter.species,
-                        level=random.randint(generated_encounter.min_level,
-                                             generated_encounter.max_level),
+                        level=rng.randint(generated_encounter.min_level,
+                                          generated_encounter.max_level),
                         moves=generated_encounter.moves
                     )
                 )
@@ -98,6 +97,23 @@ class Wall(Tile):
         self.blocks_movement = True
 
 
+class PortalTile(TilePlus):
+    """Base class for tiles that teleport players who move onto them.
+
+    The tile's data must have a world_id and a spawn_id.
+    """
+
+    async def on_move_on(self, event_ctx, player_start_pos):
+        """Teleport players that move into the portal."""
+        await teleport(event_ctx.game, event_ctx.ws, event_ctx.username,
+                       event_ctx.player, self.data.world_id,
+                       self.data.spawn_id)
+
+    def get_destination(self):
+        """Get the world_id and spawn_id the portal sends players to."""
+        return PortalLink(self.data.world_id, self.data.spawn_id)
+
+
 class PortalData(GroundData):
     """Stores information about the destination of a portal tile."""
 
@@ -123,26 +139,14 @@ class PortalData(GroundData):
 
 
 @register_tile_plus("portal", PortalData)
-class Portal(TilePlus):
+class Portal(PortalTile):
     """Class for the portal tile."""
 
-    async def on_move_on(self, event_ctx, player_start_pos):
-        """Teleport players that move into the portal."""
-        await teleport(event_ctx.game, event_ctx.ws, event_ctx.username,
-                       event_ctx.player, self.data.world_id,
-                       self.data.spawn_id)
-
 
 @register_tile_plus("invisible_portal", PortalData)
-class InvisiblePortal(TilePlus):
+class InvisiblePortal(PortalTile):
     """Class for the invisible portal tile."""
 
-    async def on_move_on(self, event_ctx, player_start_pos):
-        """Teleport players that move into the portal."""
-        await teleport(event_ctx.game, event_ctx.ws, event_ctx.username,
-                       event_ctx.player, self.data.world_id,
-                       self.data.spawn_id)
-
 
 class SignData(GroundData):
     """Stores information about the text and ground tile of a sign tile."""
@@ -307,59 +311,29 @@ class Chair(TilePlus):
 
 
 @register_tile_plus("left_door", PortalData)
-class LeftDoor(TilePlus):
+class LeftDoor(PortalTile):
     """Class for the left door tile."""
 
-    async def on_move_on(self, event_ctx, player_start_pos):
-        """Teleport players that move into the portal."""
-        await teleport(event_ctx.game, event_ctx.ws, event_ctx.username,
-                       event_ctx.player, self.data.world_id,
-                       self.data.spawn_id)
-
 
 @register_tile_plus("right_door", PortalData)
-class RightDoor(TilePlus):
+class RightDoor(PortalTile):
     """Class for the right door tile."""
 
-    async def on_move_on(self, event_ctx, player_start_pos):
-        """Teleport players that move into the portal."""
-        await teleport(event_ctx.game, event_ctx.ws, event_ctx.username,
-                       event_ctx.player, self.data.world_id,
-                       self.data.spawn_id)
-
 
 @register_tile_plus("metal_left_door", PortalData)
-class MetalLeftDoor(TilePlus):
+class MetalLeftDoor(PortalTile):
     """Class for the metal left door tile."""
 
-    async def on_move_on(self, event_ctx, player_start_pos):
-        """Teleport players that move into the portal."""
-        await teleport(event_ctx.game, event_ctx.ws, event_ctx.username,
-                       event_ctx.player, self.data.world_id,
-                       self.data.spawn_id)
-
 
 @register_tile_plus("metal_right_door", PortalData)
-class MetalRightDoor(TilePlus):
+class MetalRightDoor(PortalTile):
     """Class for the metal right door tile."""
 
-    async def on_move_on(self, event_ctx, player_start_pos):
-        """Teleport players that move into the portal."""
-        await teleport(event_ctx.game, event_ctx.ws, event_ctx.username,
-                       event_ctx.player, self.data.world_id,
-                       self.data.spawn_id)
-
 
 @register_tile_plus("mat", PortalData)
-class Mat(TilePlus):
+class Mat(PortalTile):
     """Class for the mat tile."""
 
-    async def on_move_on(self, event_ctx, player_start_pos):
-        """Teleport players that move into the portal."""
-        await teleport(event_ctx.game, event_ctx.ws, event_ctx.username,
-                       event_ctx.player, self.data.world_id,
-                       self.data.spawn_id)
-
 
 @register_tile_plus("countertop", GroundData)
 class Countertop(TilePlus):
@@ -394,15 +368,9 @@ class StairData(TileMetadata):
 
 
 @register_tile_plus("stair_top_ascending", StairData)
-class StairTopAscending(TilePlus):
+class StairTopAscending(PortalTile):
     """Class for the stair (top, ascending) tile."""
 
-    async def on_move_on(self, event_ctx, player_start_pos):
-        """Teleport players that move into the portal."""
-        await teleport(event_ctx.game, event_ctx.ws, event_ctx.username,
-                       event_ctx.player, self.data.world_id,
-                       self.data.spawn_id)
-
 
 @register_tile("stair_bottom_ascending")
 class StairBottomAscending(Tile):
@@ -415,15 +383,9 @@ class StairTopDescending(Tile):
 
 
 @register_tile_plus("stair_bottom_descending", StairData)
-class StairBottomDescending(TilePlus):
+class StairBottomDescending(PortalTile):
     """Class for the stair (bottom, descending) tile."""
 
-    async def on_move_on(self, event_ctx, player_start_pos):
-        """Teleport players that move into the portal."""
-        await teleport(event_ctx.game, event_ctx.ws, event_ctx.username,
-                       event_ctx.player, self.data.world_id,
-                       self.data.spawn_id)
-
 
 @register_tile_plus("couch", GroundData)
 class Couch(TilePlus):
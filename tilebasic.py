@@ -17,6 +17,12 @@ TileEventContext = namedtuple("TileEventContext", [
     "tile_pos"
 ])
 
+# Where a portal tile sends the players who move onto it.
+PortalLink = namedtuple("PortalLink", [
+    "world_id",
+    "spawn_id"
+])
+
 
 class Tile:
     """The Tile class encompasses things in the game that are grid-locked."""
@@ -35,6 +41,20 @@ class Tile:
     async def on_interact(self, event_ctx):
         """Triggered whenever the player interacts while touching the tile."""
 
+    @classmethod
+    def has_move_on_trigger(cls):
+        """Check if the tile class does anything when moved onto."""
+        return cls.on_move_on is not Tile.on_move_on
+
+    @classmethod
+    def has_interact_trigger(cls):
+        """Check if the tile class does anything when interacted with."""
+        return cls.on_interact is not Tile.on_interact
+
+    def get_destination(self):
+        """Get the PortalLink of a portal tile, or None for other tiles."""
+        return None
+
     @staticmethod
     def get_bounding_box(tile_pos):
         """Get the BoundingBox for the tile, given its position."""
@@ -1,17 +1,125 @@
 """Utility methods to send messages to the client."""
-import json
+import asyncio
+from typing import Any, Dict
 from websockets.exceptions import ConnectionClosed
 
-from storeworld import world_to_client_json
+from compression import precompress
+from config import Config
+from serializer import dumps
+from offload import get_client_hash
+from storeworld import (
+    chunk_to_client_json, entities_to_client_message, world_to_client_json)
+
+
+# Maps WebSockets to the tasks streaming them the rest of a world's chunks.
+_chunk_streams: Dict[Any, Any] = {}
 
 
 class Util:
     """Contains the utility methods."""
 
     @staticmethod
-    async def send_world(ws, world, spawn_pos):
-        """See the world message under PROTOCOL.md for explanation."""
+    async def send_world(ws, world, spawn_pos, world_cache=None):
+        """See the world message under PROTOCOL.md for explanation.
+
+        The chunks near spawn_pos are sent before returning. The others
+        are streamed in the background, nearest first.
+
+        Args:
+            ws: The player's Session to send the world through.
+            world: The World to send.
+            spawn_pos: The position the player spawns at.
+            world_cache: The set of world hashes the client has cached,
+                or None if the client does not cache worlds. The hash of
+                the world is added once all of it has been written to an
+                open connection.
+        """
+        old_stream = _chunk_streams.pop(ws, None)
+        if old_stream:
+            old_stream.cancel()
+        world_hash = await get_client_hash(world)
+        if world_cache is not None and world_hash in world_cache:
+            await ws.send(
+                f"world|{world_to_client_json(world, spawn_pos, True)}")
+            return
         await ws.send(f"world|{world_to_client_json(world, spawn_pos)}")
+        chunks = world.get_chunks_by_distance(spawn_pos)
+        near_count = Util.get_near_chunk_count()
+        all_sent = True
+        for chunk_x, chunk_y in chunks[:near_count]:
+            if not await Util.send_chunk(ws, world, chunk_x, chunk_y):
+                all_sent = False
+        if len(chunks) > near_count:
+            _chunk_streams[ws] = asyncio.ensure_future(Util.stream_chunks(
+                ws, world, chunks[near_count:], world_hash,
+                world_cache if all_sent else None))
+        elif world_cache is not None and all_sent:
+            world_cache.add(world_hash)
+
+    @staticmethod
+    def get_near_chunk_count():
+        """Get how many chunks are sent before send_world returns."""
+        return (2 * Config.CHUNK_RADIUS + 1) ** 2
+
+    @staticmethod
+    async def stream_chunks(ws, world, chunks, world_hash, world_cache=None):
+        """Send the given chunks one by one through a player's Session.
+
+        If the connection is lost, streaming pauses until the session is
+        resumed, so the chunks do not crowd the other messages out of
+        the session's buffer, and stops if the session expires. The
+        chunk that found the connection lost is kept by the session and
+        sent when it is resumed. When every chunk has been sent,
+        world_hash, the hash of the world when it was sent, is added to
+        world_cache, if given.
+        """
+        try:
+            for chunk_x, chunk_y in chunks:
+                if (not await Util.send_chunk(ws, world, chunk_x, chunk_y)
+                        and not await ws.wait_attached()):
+                    return
+            if world_cache is not None:
+                world_cache.add(world_hash)
+        finally:
+            if _chunk_streams.get(ws) is asyncio.current_task():
+                del _chunk_streams[ws]
+
+    @staticmethod
+    async def send_chunk(ws, world, chunk_x, chunk_y):
+        """See the chunk message under PROTOCOL.md for explanation.
+
+        Returns:
+            True if the chunk was written to an open connection.
+        """
+        return await ws.send(Util.get_chunk_message(world, chunk_x, chunk_y))
+
+    @staticmethod
+    def get_chunk_message(world, chunk_x, chunk_y):
+        """Get the chunk message of a chunk, pre-compressed.
+
+        The message is cached on the world next to the chunk's JSON
+        string, so a chunk is only encoded once. It is compressed again
+        if it has been dropped from the pre-compressed messages since.
+        """
+        message = world.client_chunk_messages.get((chunk_x, chunk_y))
+        if message is None:
+            message = f"chunk|{chunk_to_client_json(world, chunk_x, chunk_y)}"
+            world.client_chunk_messages[(chunk_x, chunk_y)] = message
+        precompress(message)
+        return message
+
+    @staticmethod
+    async def send_tile_change(game, world, tile_coord):
+        """See the tilechange message under PROTOCOL.md for explanation.
+
+        The message is sent to every player in the world.
+        """
+        tile_str = dumps(world.get_tile(tile_coord).to_json(True))
+        message = (f"tilechange|{tile_coord.block_x}|{tile_coord.block_y}"
+                   f"|{tile_str}")
+        await asyncio.gather(*(
+            Util.send_if_open(player.ws, message)
+            for player in game.get_players_by_world(world.get_world_id())))
 
     @staticmethod
     async def send_moved_to(ws, pos):
@@ -28,18 +136,14 @@ class Util:
         """See the players message under PROTOCOL.md for explanation."""
         players_str = "|".join(
             f"{p.username}|{p.pos.x}|{p.pos.y}"
-            for p in game.players
-            if p.world_id == world_id
-            and p.username != player_username)
+            for p in game.get_players_by_world(world_id)
+            if p.username != player_username)
         await ws.send("players|"+players_str)
 
     @staticmethod
     async def send_entities(ws, world):
         """See the entities message under PROTOCOL.md for explanation."""
-        entities_str = "|".join(
-            json.dumps(e.to_json(True), separators=(",", ":"))
-            for e in world.entities)
-        await ws.send("entities|"+entities_str)
+        await ws.send(entities_to_client_message(world))
 
     @staticmethod
     async def send_dialogue(ws, entity_name, dialogue_text):
@@ -57,18 +161,21 @@ class Util:
         await ws.send(f"dialogueend|{entity_name}")
 
     @staticmethod
-    async def send_tag(game, tagging_player, tagged_player):
-        """See the tag message under PROTOCOL.md for explanation."""
-        message = f"tag|{tagging_player}|{tagged_player}"
-        try:
-            await game.get_player(tagging_player).ws.send(message)
-        except ConnectionClosed:
-            pass
+    async def send_if_open(ws, message):
+        """Send a message, doing nothing if the connection is closed."""
         try:
-            await game.get_player(tagged_player).ws.send(message)
+            await ws.send(message)
         except ConnectionClosed:
             pass
 
+    @staticmethod
+    async def send_tag(game, tagging_player, tagged_player):
+        """See the tag message under PROTOCOL.md for explanation."""
+        message = f"tag|{tagging_player}|{tagged_player}"
+        await asyncio.gather(
+            Util.send_if_open(game.get_player(tagging_player).ws, message),
+            Util.send_if_open(game.get_player(tagged_player).ws, message))
+
     @staticmethod
     async def send_battle_start(ws, side):
         """See the battlestart message under PROTOCOL.md for explanation."""
@@ -82,8 +189,7 @@ class Util:
     @staticmethod
     async def send_battle_status(ws, battle, side):
         """See the battlestatus message under PROTOCOL.md for explanation."""
-        battle_str = json.dumps(battle.to_json(side),
-                                separators=(",", ":"))
+        battle_str = dumps(battle.to_json(side))
         await ws.send(f"battlestatus|{battle_str}")
 
     @staticmethod
@@ -1,15 +1,19 @@
 """Defines the World class."""
 from collections import namedtuple
+import copy
 from typing import Dict
 
 from battle import Move, Species
-from cutscene import Cutscene
+from config import Config
+from cutscene import Cutscene, CutsceneTimeline
 from entitybasic import Entity
+from pathfinding import pathfinder
 from tilebasic import Empty, Tile
 from tilecoord import TileCoord
 
 
 _worlds: Dict[str, "World"] = {}
+_instances: Dict[str, "World"] = {}  # Maps world_ids to World instances.
 
 
 class Encounter(namedtuple("Encounter", [
@@ -46,6 +50,15 @@ class World:
     """The World class represents an area where the player can explore.
 
     Different Worlds are linked together through portals.
+
+    An instanced World is a template: each player (or each group of
+    players sharing an instance_key) entering it through a portal gets
+    an instance of their own, made by create_instance. An instance
+    shares the template's tiles, trigger index, encounter patches,
+    cutscenes, client cache and navigation grid, so only its entities
+    are its own. The shared data is copied by copy_on_write before the
+    instance is changed, and source is the World it is shared with:
+    the template, or the instance itself once it has been copied.
     """
 
     def __init__(self, tiles, entities, spawn_points, cutscenes, patches):
@@ -55,6 +68,168 @@ class World:
         self.spawn_points = spawn_points
         self.cutscenes = cutscenes
         self.patches = patches
+        self.world_id = None
+        self.instanced = False
+        self.template = None
+        self.source = self
+        self.shared_rows = set()
+        self.entity_dicts = None
+        self.journal = None
+        self.client_chunks = {}
+        self.client_chunk_messages = {}
+        self.client_hash = None
+        self.client_version = 0
+        self.client_entities = None
+        self.active_entities = {}
+        for entity in entities:
+            entity.active_set = self.active_entities
+            entity.wake()
+        self.move_on_triggers = set()
+        self.interact_triggers = set()
+        self.portals = {}
+        self.portal_zones = {}
+        self.build_trigger_index()
+        self.nav_version = 0
+        self.resolve_cutscene_paths()
+        self.cutscene_timeline = None
+
+    def build_trigger_index(self):
+        """Find the tiles which react to being moved onto or interacted with.
+
+        Most tiles do nothing when moved onto or interacted with, so
+        event handlers only need to be called for the TileCoords in
+        move_on_triggers and interact_triggers. The PortalLinks of the
+        portals among them are kept in portals.
+        """
+        self.move_on_triggers.clear()
+        self.interact_triggers.clear()
+        self.portals = {}
+        for block_y, row in enumerate(self.tiles):
+            for block_x, tile in enumerate(row):
+                tile_class = type(tile)
+                if tile_class.has_move_on_trigger():
+                    self.move_on_triggers.add(TileCoord(block_x, block_y))
+                    destination = tile.get_destination()
+                    if destination is not None:
+                        self.portals[TileCoord(block_x, block_y)] = destination
+                if tile_class.has_interact_trigger():
+                    self.interact_triggers.add(TileCoord(block_x, block_y))
+        self.build_portal_zones()
+
+    def build_portal_zones(self):
+        """Find the tiles near each portal.
+
+        portal_zones maps each TileCoord within
+        Config.PORTAL_PREFETCH_RADIUS blocks of a portal, in both
+        directions, to the PortalLinks of the portals near it.
+        """
+        radius = Config.PORTAL_PREFETCH_RADIUS
+        self.portal_zones = {}
+        for (block_x, block_y), destination in self.portals.items():
+            for zone_y in range(block_y - radius, block_y + radius + 1):
+                for zone_x in range(block_x - radius, block_x + radius + 1):
+                    self.portal_zones.setdefault(
+                        TileCoord(zone_x, zone_y), set()).add(destination)
+
+    def resolve_cutscene_paths(self):
+        """Find the paths that the world's cutscenes move entities along."""
+        positions = {}
+        for cutscene in self.cutscenes:
+            cutscene.resolve_path(self, positions)
+
+    def start_cutscenes(self):
+        """Start playing the world's cutscenes for the players in it.
+
+        If they are already playing, they are finished first.
+        """
+        if self.cutscene_timeline is not None:
+            self.cutscene_timeline.skip_to_end()
+            self.cutscene_timeline = None
+        if self.cutscenes:
+            self.cutscene_timeline = CutsceneTimeline(self)
+
+    def advance_cutscenes(self, dt):
+        """Move the world's cutscenes forward by dt seconds."""
+        if self.cutscene_timeline is not None:
+            self.cutscene_timeline.advance(dt)
+            if self.cutscene_timeline.is_done():
+                self.cutscene_timeline = None
+
+    def invalidate_navigation(self, tile_coords=None):
+        """Update paths and flow fields after the world's tiles have changed.
+
+        Cutscene paths are recomputed. They are sent to the client, so
+        invalidate_client_cache must be called as well.
+
+        Args:
+            tile_coords: The TileCoords of the tiles that changed, or None
+                to rebuild everything.
+        """
+        self.copy_on_write()
+        self.nav_version += 1
+        pathfinder.on_tiles_changed(self, tile_coords)
+        self.resolve_cutscene_paths()
+
+    def create_instance(self, instance_key):
+        """Make and register an instance of an instanced World.
+
+        The instance starts with fresh copies of the entities in the
+        template's world file, and shares everything else.
+        """
+        if not self.instanced:
+            raise ValueError
+        instance = copy.copy(self)
+        instance.template = self
+        instance.instanced = False
+        instance.world_id = None
+        instance.cutscene_timeline = None
+        instance.client_entities = None
+        instance.entities = [
+            Entity.from_json(entity_dict)
+            for entity_dict in self.entity_dicts]
+        instance.active_entities = {}
+        for entity in instance.entities:
+            entity.active_set = instance.active_entities
+            entity.wake()
+        world_id = World.get_instance_id(self.get_world_id(), instance_key)
+        _instances[world_id] = instance
+        instance.world_id = world_id
+        return instance
+
+    def copy_on_write(self):
+        """Stop sharing data with the template before changing an instance.
+
+        The rows of tiles are still shared until get_writable_row is
+        called for them. Does nothing for a World that is not shared.
+        """
+        if self.source is self:
+            return
+        self.tiles = list(self.tiles)
+        self.shared_rows = set(range(len(self.tiles)))
+        self.move_on_triggers = set(self.move_on_triggers)
+        self.interact_triggers = set(self.interact_triggers)
+        self.portals = dict(self.portals)
+        self.cutscenes = [
+            Cutscene.from_json(cutscene.to_json(False))
+            for cutscene in self.cutscenes]
+        self.resolve_cutscene_paths()
+        self.client_chunks = dict(self.source.client_chunks)
+        self.client_chunk_messages = dict(self.source.client_chunk_messages)
+        self.client_hash = self.source.client_hash
+        self.source = self
+
+    def get_writable_row(self, block_y):
+        """Get a row of tiles that can be changed without affecting others.
+
+        An instance gets its own copy of the row the first time.
+        """
+        self.copy_on_write()
+        row = self.tiles[block_y]
+        if block_y in self.shared_rows:
+            row = list(row)
+            self.tiles[block_y] = row
+            self.shared_rows.discard(block_y)
+        return row
 
     def get_tile(self, tile_coord):
         """Get the tile positioned at the given TileCoord."""
@@ -63,6 +238,69 @@ class World:
         except IndexError:
             return Empty()
 
+    def set_tile(self, tile_coord, tile):
+        """Replace the tile at the given TileCoord while the world is running.
+
+        Only what depends on that tile is updated: the trigger index
+        entry and portal, the cached client chunk containing it, the
+        client hash, and, if whether the tile blocks movement changed,
+        navigation.
+        The change is recorded in the world's journal, if it has one.
+        Players in the world must be sent a tilechange message.
+
+        Raises:
+            ValueError if the TileCoord is outside the world, or if the
+            world is the template of instances, whose rows they share.
+        """
+        block_x, block_y = tile_coord
+        if self.instanced:
+            raise ValueError
+        if not (0 <= block_y < len(self.tiles)
+                and 0 <= block_x < len(self.tiles[block_y])):
+            raise ValueError
+        row = self.get_writable_row(block_y)
+        old_tile = row[block_x]
+        row[block_x] = tile
+        tile_class = type(tile)
+        for triggers, has_trigger in (
+                (self.move_on_triggers, tile_class.has_move_on_trigger()),
+                (self.interact_triggers, tile_class.has_interact_trigger())):
+            if has_trigger:
+                triggers.add(tile_coord)
+            else:
+                triggers.discard(tile_coord)
+        old_destination = self.portals.pop(tile_coord, None)
+        destination = None
+        if tile_class.has_move_on_trigger():
+            destination = tile.get_destination()
+        if destination is not None:
+            self.portals[tile_coord] = destination
+        if destination != old_destination:
+            self.build_portal_zones()
+        chunk = (block_x // Config.CHUNK_SIZE, block_y // Config.CHUNK_SIZE)
+        self.client_chunks.pop(chunk, None)
+        self.client_chunk_messages.pop(chunk, None)
+        self.client_hash = None
+        self.client_version += 1
+        if old_tile.blocks_movement != tile.blocks_movement:
+            self.invalidate_navigation([tile_coord])
+        if self.journal is not None:
+            self.journal.record_tile(tile_coord, tile)
+
+    def replace_entity(self, entity_dict):
+        """Replace the entity with the same name as a saved entity.
+
+        Raises:
+            ValueError if the world has no entity with that name.
+        """
+        new_entity = Entity.from_json(entity_dict)
+        old_entity = self.get_entity(new_entity.name)
+        self.entities[self.entities.index(old_entity)] = new_entity
+        self.active_entities.pop(old_entity, None)
+        new_entity.active_set = self.active_entities
+        new_entity.wake()
+        self.client_entities = None
+
     def get_entity(self, name):
         """Get the entity with the given name."""
         try:
@@ -102,35 +340,140 @@ class World:
             for patch_id, patch
             in world_dict["patches"].items()}
 
-        return World(tiles, entities, spawn_points, cutscenes, patches)
+        world = World(tiles, entities, spawn_points, cutscenes, patches)
+        if world_dict.get("instanced", False):
+            world.instanced = True
+            world.entity_dicts = world_dict["entities"]
+        return world
+
+    def get_width(self):
+        """Get the width of the world in blocks."""
+        return max((len(row) for row in self.tiles), default=0)
 
-    def to_json_client(self, spawn_pos):
-        """Convert a world to a dict which can be converted to a JSON string.
+    def get_height(self):
+        """Get the height of the world in blocks."""
+        return len(self.tiles)
 
-        This method is for data that will be sent to the client.
+    def get_chunks(self):
+        """Get the chunks of the world, in the order words run on a page.
+
+        Chunks are squares of Config.CHUNK_SIZE by Config.CHUNK_SIZE tiles,
+        identified by (chunk_x, chunk_y).
         """
-        tiles_list = []
-        for row in self.tiles:
-            row_tiles = []
-            for tile in row:
-                row_tiles.append(tile.to_json(True))
-            tiles_list.append(row_tiles)
+        chunks_x = -(-self.get_width() // Config.CHUNK_SIZE)
+        chunks_y = -(-self.get_height() // Config.CHUNK_SIZE)
+        return [(chunk_x, chunk_y)
+                for chunk_y in range(chunks_y)
+                for chunk_x in range(chunks_x)]
 
-        entity_list = [entity.to_json(True) for entity in self.entities]
+    def get_chunks_by_distance(self, pos):
+        """Get the chunks of the world, nearest to the given position first.
+
+        Distance is measured in chunks from the chunk containing pos,
+        along the longer axis.
+        """
+        tile_coord = TileCoord.pos_to_tile_coord(pos)
+        pos_chunk_x = tile_coord.block_x // Config.CHUNK_SIZE
+        pos_chunk_y = tile_coord.block_y // Config.CHUNK_SIZE
+        chunks = self.get_chunks()
+        chunks.sort(key=lambda chunk: max(abs(chunk[0] - pos_chunk_x),
+                                          abs(chunk[1] - pos_chunk_y)))
+        return chunks
+
+    def to_json_client(self, spawn_pos, client_hash, is_cached=False):
+        """Convert a world to a dict which can be converted to a JSON string.
+
+        This method is for data that will be sent to the client. The
+        tiles are not included; they are sent in chunks (see
+        to_json_client_chunk).
+
+        Args:
+            spawn_pos: The position the player spawns at.
+            client_hash: The hash of the world's static client data.
+            is_cached: True if the client already has the static data
+                with the given hash, in which case it is left out.
+        """
+        entity_list = self.to_json_client_entities()
 
         spawn_pos_obj = spawn_pos.to_json()
 
+        if is_cached:
+            return {
+                "version": "0.4.0",
+                "hash": client_hash,
+                "cached": True,
+                "entities": entity_list,
+                "spawn_pos": spawn_pos_obj
+            }
+
+        return {
+            "version": "0.4.0",
+            "hash": client_hash,
+            "cached": False,
+            **self.to_json_client_static(),
+            "entities": entity_list,
+            "spawn_pos": spawn_pos_obj
+        }
+
+    def to_json_client_entities(self):
+        """Convert the entities to dicts to be sent to the client.
+
+        An entity in the middle of a cutscene is given the position the
+        cutscene has moved it to.
+        """
+        entity_list = [entity.to_json(True) for entity in self.entities]
+        if self.cutscene_timeline is not None:
+            moving_entity = self.cutscene_timeline.get_moving_entity()
+            if moving_entity is not None:
+                entity_obj = entity_list[self.entities.index(moving_entity)]
+                entity_obj["pos"] = self.cutscene_timeline.get_entity_pos(
+                    moving_entity).to_json()
+        return entity_list
+
+    def to_json_client_static(self):
+        """Get the client data that only changes when the world is edited.
+
+        The tiles are not included; they are sent in chunks (see
+        to_json_client_chunk).
+        """
         cutscene_list = [
             cutscene.to_json(True) for cutscene in self.cutscenes]
 
         return {
-            "version": "0.3.0",
-            "tiles": tiles_list,
-            "entities": entity_list,
-            "spawn_pos": spawn_pos_obj,
+            "width": self.get_width(),
+            "height": self.get_height(),
+            "chunk_size": Config.CHUNK_SIZE,
             "cutscenes": cutscene_list
         }
 
+    def invalidate_client_cache(self):
+        """Forget cached client data after the world has been edited."""
+        self.copy_on_write()
+        self.client_chunks.clear()
+        self.client_chunk_messages.clear()
+        self.client_hash = None
+        self.client_version += 1
+
+    def to_json_client_chunk(self, chunk_x, chunk_y):
+        """Convert a chunk to a dict which can be converted to a JSON string.
+
+        This method is for data that will be sent to the client.
+        """
+        start_x = chunk_x * Config.CHUNK_SIZE
+        start_y = chunk_y * Config.CHUNK_SIZE
+        tiles_list = []
+        for row in self.tiles[start_y:start_y + Config.CHUNK_SIZE]:
+            row_tiles = []
+            for tile in row[start_x:start_x + Config.CHUNK_SIZE]:
+                row_tiles.append(tile.to_json(True))
+            tiles_list.append(row_tiles)
+
+        return {
+            "chunk_x": chunk_x,
+            "chunk_y": chunk_y,
+            "tiles": tiles_list
+        }
+
     def to_json_save(self):
         """Convert a world to a dict which can be converted to a JSON string.
 
@@ -157,7 +500,7 @@ class World:
             patch_id: [encounter.to_json() for encounter in patch]
             for patch_id, patch in self.patches.items()}
 
-        return {
+        world_obj = {
             "version": "0.4.0",
             "tiles": tiles_list,
             "entities": entity_list,
@@ -165,23 +508,54 @@ class World:
             "cutscenes": cutscene_list,
             "patches": patch_list
         }
+        if self.instanced:
+            world_obj["instanced"] = True
+        return world_obj
 
     @staticmethod
     def get_world_by_id(world_id):
-        """Get the World corresponding to a world_id."""
-        world = _worlds.get(world_id)
-        if not world:
+        """Get the World corresponding to a world_id.
+
+        An instance that has been released is made again.
+        """
+        world = _worlds.get(world_id) or _instances.get(world_id)
+        if world:
+            return world
+        template_id, separator, instance_key = world_id.partition("@")
+        template = _worlds.get(template_id)
+        if not separator or not template or not template.instanced:
             raise ValueError
-        return world
+        return template.create_instance(instance_key)
+
+    @staticmethod
+    def get_worlds():
+        """Get every registered World, not counting instances."""
+        return list(_worlds.values())
+
+    @staticmethod
+    def get_instance_id(world_id, instance_key):
+        """Get the world_id a player enters through a portal to world_id.
+
+        For an instanced World, this is the world_id of the instance
+        belonging to the given instance_key.
+        """
+        template = _worlds.get(world_id)
+        if not template or not template.instanced:
+            return world_id
+        return f"{world_id}@{instance_key}"
+
+    @staticmethod
+    def release_world(world_id):
+        """Tear down a World that nobody is in, if it is an instance."""
+        instance = _instances.pop(world_id, None)
+        if instance is not None:
+            pathfinder.forget_world(instance)
 
     def get_world_id(self):
         """Get the world_id of a World."""
-        try:
-            return next(
-                world_id for world_id, world in _worlds.items()
-                if world == self)
-        except StopIteration:
+        if self.world_id is None:
             raise ValueError
+        return self.world_id
 
     @staticmethod
     def register_world(world_id, world):
@@ -189,3 +563,4 @@ class World:
         if world_id in _worlds:
             raise ValueError
         _worlds[world_id] = world
+        world.world_id = world_id
@@ -0,0 +1,9 @@
+"""Defines change_tile to edit a world while players are in it."""
+
+from util import Util
+
+
+async def change_tile(game, world, tile_coord, tile):
+    """Replace a tile and send the change to the players in the world."""
+    world.set_tile(tile_coord, tile)
+    await Util.send_tile_change(game, world, tile_coord)